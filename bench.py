@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import contextlib
+import tempfile
+from pathlib import Path
+
+import httpx
+
+BOT_TOKEN = "123456:BENCH"
+ADMIN_ID = 1
+FLOW_ADMINS = list(range(2, 10))
+ROOT = Path(__file__).resolve().parent
+
+DEFAULT_MIX = "start:4,menu_channels:2,menu_sites:2,menu_sites:p2:1,back_home:2,analiz:0.1,addsite:0.2"
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="main.py için sahte Bot API üzerinde yük testi")
+    p.add_argument("--updates", type=int, default=2000, help="gönderilecek update sayısı")
+    p.add_argument("--rate", type=float, default=0, help="saniyede update (0 = sınırsız)")
+    p.add_argument("--users", type=int, default=500, help="update gönderen farklı kullanıcı sayısı")
+    p.add_argument("--data-users", type=int, default=10000, help="veri dosyasına önceden yazılan started_users")
+    p.add_argument("--data-days", type=int, default=30, help="veri dosyasına önceden yazılan analiz günü")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="tür:ağırlık listesi (start, analiz, addsite ya da callback verisi)")
+    p.add_argument("--replay", help="satır başına bir Update JSON'u içeren dosya")
+    p.add_argument("--api-latency", type=float, default=0, help="sahte Bot API gecikmesi (ms)")
+    p.add_argument("--concurrency", type=int, default=None, help="aynı anda işlenen update (varsayılan CONCURRENT_UPDATES)")
+    p.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    p.add_argument("--throttle", action="store_true", help="kullanıcı başı flood kontrolünü açık bırak")
+    p.add_argument("--webhook", action="store_true", help="update'leri localhost'taki webhook sunucusuna POST et")
+    p.add_argument("--json", action="store_true", help="raporu JSON olarak yaz")
+    return p.parse_args()
+
+
+def prepare_workdir(args) -> Path:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-"))
+    shutil.copy(ROOT / "banner.jpg", workdir / "banner.jpg")
+
+    with (ROOT / "links.json").open("r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    now = int(time.time())
+    data["started_users"] = list(range(10_000_000, 10_000_000 + args.data_users))
+    data["user_seen"] = {"first": [now] * args.data_users, "last": [now] * args.data_users}
+
+    hourly = {}
+    for d in range(args.data_days):
+        day = time.strftime("%Y-%m-%d", time.localtime(now - d * 86400))
+        hourly[day] = {f"{h:02d}": random.randint(0, 500) for h in range(24)}
+    data["analytics"] = {"hourly": hourly}
+
+    with (workdir / "links.json").open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return workdir
+
+
+class FakeBotApi:
+    def __init__(self, latency_ms: float) -> None:
+        self.latency = latency_ms / 1000
+        self.calls: dict[str, int] = {}
+        self.message_id = 0
+
+    def _message(self, chat_id, photo: bool = False) -> dict:
+        self.message_id += 1
+        msg = {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or ADMIN_ID), "type": "private"},
+        }
+        if photo:
+            msg["photo"] = [{"file_id": "bench-photo", "file_unique_id": "bench", "width": 1, "height": 1}]
+        return msg
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = {}
+        if request.headers.get("content-type", "").startswith("application/json"):
+            params = json.loads(request.content or b"{}")
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method in ("sendPhoto", "editMessageCaption"):
+            result = self._message(params.get("chat_id"), photo=True)
+        elif method in ("sendMessage", "editMessageText", "sendDocument"):
+            result = self._message(params.get("chat_id"))
+        else:
+            result = True
+        return httpx.Response(200, json={"ok": True, "result": result})
+
+
+def message_update(update_id: int, uid: int, text: str, now: int) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": now,
+        "chat": {"id": uid, "type": "private"},
+        "from": {"id": uid, "is_bot": False, "first_name": "u"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def synthetic_updates(args) -> list[list[dict]]:
+    mix = []
+    for part in args.mix.split(","):
+        kind, _, weight = part.rpartition(":")
+        try:
+            weight = float(weight)
+        except ValueError:
+            kind, weight = part, 1.0
+        mix.append((kind.strip(), weight))
+    kinds = [k for k, _ in mix]
+    weights = [w for _, w in mix]
+
+    out = []
+    now = int(time.time())
+    i = 0
+    while i < args.updates:
+        i += 1
+        kind = random.choices(kinds, weights)[0]
+        uid = ADMIN_ID if kind == "analiz" else 20_000_000 + random.randrange(args.users)
+        user = {"id": uid, "is_bot": False, "first_name": "u"}
+        chat = {"id": uid, "type": "private"}
+
+        if kind == "addsite":
+            admin = random.choice(FLOW_ADMINS)
+            steps = ("/addsite", f"Bench Site {i}", f"https://bench.example/{i}")
+            out.append([message_update(i + k, admin, text, now) for k, text in enumerate(steps)])
+            i += len(steps) - 1
+        elif kind in ("start", "analiz"):
+            out.append([message_update(i, uid, f"/{kind}", now)])
+        else:
+            out.append([{
+                "update_id": i,
+                "callback_query": {
+                    "id": str(i),
+                    "from": user,
+                    "chat_instance": "bench",
+                    "data": kind,
+                    "message": {
+                        "message_id": i,
+                        "date": now,
+                        "chat": chat,
+                        "photo": [{"file_id": "bench-photo", "file_unique_id": "bench", "width": 1, "height": 1}],
+                        "caption": "bench",
+                    },
+                },
+            }])
+    return out
+
+
+def recorded_updates(path: str) -> list[list[dict]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [[json.loads(line)] for line in f if line.strip()]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args) -> dict:
+    import main
+    from telegram import Update
+    from telegram.request import HTTPXRequest
+
+    api = FakeBotApi(args.api_latency)
+    transport = httpx.MockTransport(api.handle)
+    app = main.build_application(
+        BOT_TOKEN,
+        request=main.TimedRequest(httpx_kwargs={"transport": transport}),
+        get_updates_request=HTTPXRequest(httpx_kwargs={"transport": transport}),
+        bulk=main.TimedRequest(pool="bulk", httpx_kwargs={"transport": transport}),
+    )
+    errors = 0
+
+    async def on_error(update, context) -> None:
+        nonlocal errors
+        errors += 1
+
+    app.add_error_handler(on_error)
+    await app.initialize()
+
+    raw = recorded_updates(args.replay) if args.replay else synthetic_updates(args)
+    total = sum(len(group) for group in raw)
+
+    latencies: list[float] = []
+    gate = asyncio.Semaphore(args.concurrency or main.CONCURRENT_UPDATES)
+    flow_locks = {uid: asyncio.Lock() for uid in FLOW_ADMINS}
+
+    def flow_lock(group):
+        user = group[0].get("message", group[0].get("callback_query", {})).get("from", {})
+        return flow_locks.get(user.get("id")) if len(group) > 1 else None
+
+    if args.webhook:
+        port = free_port()
+        secret = "bench-secret"
+        finished: dict[int, asyncio.Future] = {}
+        process_update = app.process_update
+
+        async def process_and_signal(update) -> None:
+            try:
+                await process_update(update)
+            finally:
+                done = finished.get(update.update_id)
+                if done and not done.done():
+                    done.set_result(None)
+
+        app.process_update = process_and_signal
+        await app.start()
+        await app.updater.start_webhook(
+            listen="127.0.0.1",
+            port=port,
+            url_path=main.WEBHOOK_PATH,
+            webhook_url=f"http://127.0.0.1:{port}/{main.WEBHOOK_PATH}",
+            secret_token=secret,
+        )
+        client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+            limits=httpx.Limits(max_connections=args.concurrency or main.CONCURRENT_UPDATES),
+        )
+
+        async def deliver(update: dict) -> None:
+            nonlocal errors
+            done = finished[update["update_id"]] = asyncio.get_running_loop().create_future()
+            async with gate:
+                t0 = time.perf_counter()
+                response = await client.post(f"/{main.WEBHOOK_PATH}", json=update)
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                await done
+                latencies.append(time.perf_counter() - t0)
+    else:
+        client = None
+
+        async def deliver(update: dict) -> None:
+            update = Update.de_json(update, app.bot)
+            async with gate:
+                t0 = time.perf_counter()
+                await app.process_update(update)
+                latencies.append(time.perf_counter() - t0)
+
+    api.calls.clear()
+
+    async def process(group) -> None:
+        async with flow_lock(group) or contextlib.nullcontext():
+            for update in group:
+                await deliver(update)
+
+    started = time.perf_counter()
+    tasks = []
+    sent = 0
+    for group in raw:
+        if args.rate:
+            delay = started + sent / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sent += len(group)
+        tasks.append(asyncio.create_task(process(group)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    if client is not None:
+        await client.aclose()
+        await app.updater.stop()
+        await app.stop()
+    main.compact_storage()
+    await app.shutdown()
+
+    api_calls = sum(api.calls.values())
+    return {
+        "updates": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "api_calls": api_calls,
+        "api_calls_per_update": round(api_calls / max(total, 1), 2),
+        "api_calls_by_method": dict(sorted(api.calls.items())),
+        "throttled": dict(main._throttled_total),
+        "seconds_by_kind": {
+            kind: round(sum(h.total for (k, _), h in main.METRICS.items() if k == kind), 3)
+            for kind in ("handler", "api", "pool", "storage")
+        },
+    }
+
+
+def main():
+    args = parse_args()
+    workdir = prepare_workdir(args)
+
+    os.chdir(workdir)
+    os.environ["ADMIN_IDS"] = ",".join(str(uid) for uid in [ADMIN_ID] + FLOW_ADMINS)
+    os.environ["STORAGE_BACKEND"] = args.storage
+    if not args.throttle:
+        os.environ["THROTTLE_RATE"] = "0"
+    sys.path.insert(0, str(ROOT))
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Update: {report['updates']}  Hata: {report['errors']}  Süre: {report['seconds']} sn")
+    print(f"Throughput: {report['throughput']} update/sn")
+    print(f"Gecikme p50/p95/p99: {report['p50_ms']} / {report['p95_ms']} / {report['p99_ms']} ms")
+    print(f"API çağrısı: {report['api_calls']} ({report['api_calls_per_update']} / update)")
+    for method, n in report["api_calls_by_method"].items():
+        print(f"  {method}: {n}")
+    if report["throttled"]:
+        print(f"Flood ile düşen: {report['throttled']}")
+    by_kind = report["seconds_by_kind"]
+    print(f"Toplam süre — handler: {by_kind['handler']} sn, API: {by_kind['api']} sn, depolama: {by_kind['storage']} sn")
+
+
+if __name__ == "__main__":
+    main()
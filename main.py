@@ -1,26 +1,142 @@
+import time
+
+BOOT_T0 = time.perf_counter()
+
 import os
+import sys
+import asyncio
 import json
 import html
+import contextlib
+import copy
+import math
+import zlib
+import base64
+import weakref
+import functools
+import threading
+import hashlib
+import gc
+import tracemalloc
+from array import array
+from collections import OrderedDict, deque
+from bisect import bisect_left
 from pathlib import Path
 from typing import Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+import httpx
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
+    BasePersistence,
+    ApplicationHandlerStop,
+    ExtBot,
+    PersistenceInput,
     CommandHandler,
     CallbackQueryHandler,
     ContextTypes,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
 DATA_FILE = Path("links.json")
+EVENTS_FILE = Path("events.jsonl")
+SQLITE_FILE = Path(os.getenv("SQLITE_FILE", "bot.db"))
+SQLITE_EVENTS_KEEP = int(os.getenv("SQLITE_EVENTS_KEEP", "20000"))
+JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", str(1024 * 1024)))
+JOURNAL_COMPACT_SECONDS = int(os.getenv("JOURNAL_COMPACT_SECONDS", "300"))
+STORAGE_CAS_RETRIES = int(os.getenv("STORAGE_CAS_RETRIES", "5"))
+CLICK_FLUSH_EVERY = int(os.getenv("CLICK_FLUSH_EVERY", "50"))
+CLICK_FLUSH_SECONDS = int(os.getenv("CLICK_FLUSH_SECONDS", "10"))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "20000"))
+ANALYTICS_HOURLY_DAYS = int(os.getenv("ANALYTICS_HOURLY_DAYS", "14"))
+ANALYTICS_DAILY_DAYS = int(os.getenv("ANALYTICS_DAILY_DAYS", "120"))
+ANALYTICS_WEEKLY_WEEKS = int(os.getenv("ANALYTICS_WEEKLY_WEEKS", "104"))
+HLL_PRECISION = int(os.getenv("HLL_PRECISION", "10"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+BROADCAST_PROGRESS_SECONDS = float(os.getenv("BROADCAST_PROGRESS_SECONDS", "5"))
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "200"))
+BROADCAST_DIR = Path("broadcasts")
+BROADCAST_AUTO_WINDOW = int(os.getenv("BROADCAST_AUTO_WINDOW", str(2 * 3600)))
+FLOWS_FILE = Path("flows.json")
+FLOW_PERSIST_SECONDS = float(os.getenv("FLOW_PERSIST_SECONDS", "10"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+PORT = int(os.getenv("PORT", "8443"))
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "64"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+BULK_POOL_SIZE = int(os.getenv("BULK_POOL_SIZE", str(BROADCAST_CONCURRENCY + 2)))
+BULK_POOL_TIMEOUT = float(os.getenv("BULK_POOL_TIMEOUT", "30"))
+BULK_READ_TIMEOUT = float(os.getenv("BULK_READ_TIMEOUT", "20"))
+HTTP2 = os.getenv("HTTP2", "").strip().lower() in ("1", "true", "yes")
+LIST_PAGE_SIZE = max(2, int(os.getenv("LIST_PAGE_SIZE", "10")))
+LIST_CHUNK_CHARS = int(os.getenv("LIST_CHUNK_CHARS", "4000"))
+LIST_DOCUMENT_LINKS = int(os.getenv("LIST_DOCUMENT_LINKS", "300"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(1024 * 1024)))
+PENDING_UPDATES = os.getenv("PENDING_UPDATES", "stale").strip().lower()
+PENDING_MAX_AGE = int(os.getenv("PENDING_MAX_AGE", "120"))
+BOOT_DEFER_SECONDS = float(os.getenv("BOOT_DEFER_SECONDS", "5"))
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_WINDOW = float(os.getenv("THROTTLE_WINDOW", "2"))
+THROTTLE_USERS = int(os.getenv("THROTTLE_USERS", "10000"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "30"))
 BANNER_FILE = "banner.jpg"
 FAST_RESERVATION_URL = "https://t.me/lotusprivate?direct"
 TZ = ZoneInfo("Europe/Istanbul")
 
+BOOT_PHASES: dict[str, float] = {}
+_boot_mark = BOOT_T0
+_stale_dropped = 0
+
+
+def process_age() -> Optional[float]:
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+    except Exception:
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def mark_boot(phase: str) -> None:
+    global _boot_mark
+
+    now = time.perf_counter()
+    BOOT_PHASES[phase] = now - _boot_mark
+    _boot_mark = now
+
+
+def boot_report() -> str:
+    parts = [f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in BOOT_PHASES.items()]
+    return "Açılış: " + ", ".join(parts) + f" (toplam {sum(BOOT_PHASES.values()):.2f} sn)"
+
+
+_age = process_age()
+if _age is not None:
+    BOOT_PHASES["interpreter"] = max(0.0, _age - (time.perf_counter() - BOOT_T0))
+mark_boot("imports")
+
 HOME_TEXT_HTML = (
     "✨ <b>Lotus Private Link Merkezi</b>\n"
     "<i>Kanallarımız ve sitelerimiz tek yerde.</i>\n\n"
@@ -39,68 +155,1607 @@ DEFAULT_SITES = [
 ]
 
 
-def save_data(data: dict) -> None:
-    with DATA_FILE.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+class AudienceIndex:
+    __slots__ = ("ids", "first_seen", "last_seen", "active")
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.first_seen = array("I")
+        self.last_seen = array("I")
+        self.active = array("B")
+
+    @classmethod
+    def from_json(cls, users: list, seen: Optional[dict] = None) -> "AudienceIndex":
+        seen = seen or {}
+        first = seen.get("first") or []
+        last = seen.get("last") or []
+        inactive = set(seen.get("inactive") or [])
 
+        rows = {}
+        for i, x in enumerate(users):
+            try:
+                uid = int(x)
+            except Exception:
+                continue
+            f = int(first[i]) if i < len(first) else 0
+            l = int(last[i]) if i < len(last) else 0
+            rows.setdefault(uid, (f, l))
+
+        index = cls()
+        for uid in sorted(rows):
+            f, l = rows[uid]
+            index.ids.append(uid)
+            index.first_seen.append(f)
+            index.last_seen.append(l)
+            index.active.append(0 if uid in inactive else 1)
+        return index
+
+    def to_json(self) -> Tuple[list, dict]:
+        seen = {
+            "first": self.first_seen.tolist(),
+            "last": self.last_seen.tolist(),
+        }
+        inactive = self.inactive_ids()
+        if inactive:
+            seen["inactive"] = inactive
+        return self.ids.tolist(), seen
+
+    def _find(self, uid: int) -> int:
+        i = bisect_left(self.ids, uid)
+        if i < len(self.ids) and self.ids[i] == uid:
+            return i
+        return -1
+
+    def add(self, uid: int, ts: int) -> bool:
+        i = bisect_left(self.ids, uid)
+        if i < len(self.ids) and self.ids[i] == uid:
+            if ts > self.last_seen[i]:
+                self.last_seen[i] = ts
+            self.active[i] = 1
+            return False
+
+        self.ids.insert(i, uid)
+        self.first_seen.insert(i, ts)
+        self.last_seen.insert(i, ts)
+        self.active.insert(i, 1)
+        return True
+
+    def deactivate(self, uid: int) -> bool:
+        i = self._find(uid)
+        if i < 0 or not self.active[i]:
+            return False
+        self.active[i] = 0
+        return True
+
+    def active_ids(self) -> list[int]:
+        return [uid for uid, on in zip(self.ids, self.active) if on]
+
+    def inactive_ids(self) -> list[int]:
+        return [uid for uid, on in zip(self.ids, self.active) if not on]
+
+    def active_count(self) -> int:
+        return sum(self.active)
+
+    def seen(self, uid: int) -> Optional[Tuple[int, int]]:
+        i = self._find(uid)
+        if i < 0:
+            return None
+        return self.first_seen[i], self.last_seen[i]
+
+    def __contains__(self, uid: int) -> bool:
+        return self._find(int(uid)) >= 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+
+class HyperLogLog:
+    __slots__ = ("regs",)
+
+    P = HLL_PRECISION
+    M = 1 << HLL_PRECISION
+    POW = [2.0 ** -r for r in range(66)]
+
+    def __init__(self, regs: Optional[bytes] = None) -> None:
+        self.regs = bytearray(regs) if regs else bytearray(self.M)
+
+    def add(self, value: int) -> None:
+        digest = hashlib.blake2b(int(value).to_bytes(8, "little", signed=True), digest_size=8).digest()
+        h = int.from_bytes(digest, "little")
+        idx = h & (self.M - 1)
+        rank = (64 - self.P) - (h >> self.P).bit_length() + 1
+        if rank > self.regs[idx]:
+            self.regs[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.regs = bytearray(map(max, self.regs, other.regs))
+        return self
+
+    def count(self) -> int:
+        m = self.M
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(map(self.POW.__getitem__, self.regs))
+        zeros = self.regs.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes(self.regs), 9)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "HyperLogLog":
+        regs = zlib.decompress(raw)
+        return cls(regs if len(regs) == cls.M else None)
+
+    def to_json(self) -> str:
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_json(cls, value) -> "HyperLogLog":
+        if isinstance(value, HyperLogLog):
+            return value
+        return cls.from_bytes(base64.b64decode(value))
+
+
+def _map_sketches(uniques: dict, fn) -> dict:
+    return {
+        "hour": {day: {h: fn(x) for h, x in hours.items()} for day, hours in uniques.get("hour", {}).items()},
+        "day": {day: fn(x) for day, x in uniques.get("day", {}).items()},
+        "button": {day: {b: fn(x) for b, x in btns.items()} for day, btns in uniques.get("button", {}).items()},
+    }
+
+
+_click_lock = threading.Lock()
+_click_buffer: dict[Tuple[str, str, str], int] = {}
+_click_seen: set[Tuple[str, str, str, int]] = set()
+_click_buffered = 0
+_throttle_buffer: dict[Tuple[str, str], int] = {}
+_throttled_total: dict[str, int] = {}
+
+_loaded_data: Optional[dict] = None
+_menu_version = 0
+_menu_cache: dict[str, Tuple[int, InlineKeyboardMarkup]] = {}
+_rendered: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+
+
+METRIC_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class LatencyHistogram:
+    __slots__ = ("buckets", "count", "total", "errors")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(METRIC_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        ms = seconds * 1000
+        i = bisect_left(METRIC_BUCKETS_MS, ms)
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return METRIC_BUCKETS_MS[i] if i < len(METRIC_BUCKETS_MS) else float("inf")
+        return float("inf")
+
+
+METRICS: dict[Tuple[str, str], LatencyHistogram] = {}
+
+
+def observe(kind: str, name: str, seconds: float, error: bool = False) -> None:
+    hist = METRICS.get((kind, name))
+    if hist is None:
+        hist = METRICS[(kind, name)] = LatencyHistogram()
+    hist.observe(seconds, error)
+
+
+def timed(kind: str, name: str):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                observe(kind, name, time.perf_counter() - t0, error)
+
+        return wrapper
+
+    return decorate
+
+
+def _metric_label(name: str) -> str:
+    return name.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus() -> str:
+    lines = []
+    for kind in sorted({k for k, _ in METRICS}):
+        metric = f"bot_{kind}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (k, name), hist in sorted(METRICS.items()):
+            if k != kind:
+                continue
+            label = _metric_label(name)
+            cumulative = 0
+            for bound, n in zip(METRIC_BUCKETS_MS + (None,), hist.buckets):
+                cumulative += n
+                le = "+Inf" if bound is None else f"{bound / 1000:g}"
+                lines.append(f'{metric}_bucket{{name="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{name="{label}"}} {hist.total:.6f}')
+            lines.append(f'{metric}_count{{name="{label}"}} {hist.count}')
+
+        lines.append(f"# TYPE bot_{kind}_errors_total counter")
+        for (k, name), hist in sorted(METRICS.items()):
+            if k == kind:
+                lines.append(f'bot_{kind}_errors_total{{name="{_metric_label(name)}"}} {hist.errors}')
+
+    lines.append("# TYPE bot_boot_phase_seconds gauge")
+    for phase, seconds in BOOT_PHASES.items():
+        lines.append(f'bot_boot_phase_seconds{{phase="{phase}"}} {seconds:.6f}')
+    lines.append("# TYPE bot_stale_updates_dropped_total counter")
+    lines.append(f"bot_stale_updates_dropped_total {_stale_dropped}")
+    lines.append("# TYPE bot_throttled_total counter")
+    for reason, n in sorted(_throttled_total.items()):
+        lines.append(f'bot_throttled_total{{reason="{reason}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+
+class PoolTimingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, pool: str) -> None:
+        self.inner = inner
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        t0 = time.perf_counter()
+        acquired = False
+
+        async def trace(event: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired:
+                acquired = True
+                observe("pool", self.pool, time.perf_counter() - t0)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            return await self.inner.handle_async_request(request)
+        except httpx.PoolTimeout:
+            observe("pool", self.pool, time.perf_counter() - t0, True)
+            raise
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def http_version() -> str:
+    if not HTTP2:
+        return "1.1"
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("HTTP2 açık ama 'h2' kurulu değil, HTTP/1.1 kullanılıyor.")
+        return "1.1"
+    return "2"
+
+
+class TimedRequest(HTTPXRequest):
+    def __init__(self, *args, pool: str = "interactive", **kwargs) -> None:
+        httpx_kwargs = dict(kwargs.pop("httpx_kwargs", None) or {})
+        transport = httpx_kwargs.get("transport") or httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=kwargs.get("connection_pool_size", 256)),
+            http2=kwargs.get("http_version", "1.1") != "1.1",
+        )
+        httpx_kwargs["transport"] = PoolTimingTransport(transport, pool)
+        self.pool = pool
+        super().__init__(*args, httpx_kwargs=httpx_kwargs, **kwargs)
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        if self.pool != "interactive":
+            endpoint = f"{self.pool}:{endpoint}"
+        t0 = time.perf_counter()
+        error = True
+        try:
+            result = await super().do_request(url, method, *args, **kwargs)
+            error = result[0] >= 400
+            return result
+        finally:
+            observe("api", endpoint, time.perf_counter() - t0, error)
+
+
+def handler_metric_name(handler) -> str:
+    if isinstance(handler, CommandHandler):
+        return "/" + sorted(handler.commands)[0]
+    if isinstance(handler, CallbackQueryHandler):
+        return "callback"
+    return handler.callback.__name__
+
+
+def instrument_handler(handler) -> None:
+    name = handler_metric_name(handler)
+    callback = handler.callback
+
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        label = name
+        if name == "callback":
+            data = update.callback_query.data if update.callback_query else None
+            key = (data or "").partition(":")[0]
+            label = f"callback:{key if key in CALLBACK_ROUTES else 'other'}"
+
+        t0 = time.perf_counter()
+        error = True
+        try:
+            result = await callback(update, context)
+            error = False
+            return result
+        finally:
+            observe("handler", label, time.perf_counter() - t0, error)
+            if "first_update" not in BOOT_PHASES and "ready" in BOOT_PHASES:
+                mark_boot("first_update")
+                print(boot_report())
+
+    handler.callback = wrapper
+
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
 
-def ensure_data_file() -> None:
-    if not DATA_FILE.exists():
-        save_data({
-            "quick": [],
-            "channels": DEFAULT_CHANNELS,
-            "sites": DEFAULT_SITES,
-            "started_users": [],
-            "analytics": {
-                "hourly": {}
-            },
-        })
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[1] == "/metrics":
+            status, body = "200 OK", render_prometheus().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(app: Application) -> None:
+    if METRICS_PORT:
+        app.bot_data["metrics_server"] = await asyncio.start_server(serve_metrics, "0.0.0.0", METRICS_PORT)
+
+
+def metrics_summary(limit: int = 12) -> str:
+    if not METRICS:
+        return "Henüz ölçüm yok."
+
+    text = "📈 <b>METRİKLER</b>\n"
+    if BOOT_PHASES:
+        text += f"<i>{html.escape(boot_report())}</i>\n"
+    if _stale_dropped:
+        text += f"<i>Atlanan eski update: {_stale_dropped}</i>\n"
+    if _throttled_total:
+        text += f"<i>Flood ile düşen istek: {sum(_throttled_total.values())}</i>\n"
+    text += "<i>ad — adet / ort / p95 / hata</i>\n"
+    for kind, title in (
+        ("handler", "Handler"),
+        ("api", "Bot API"),
+        ("pool", "Bağlantı havuzu bekleme"),
+        ("storage", "Depolama"),
+        ("loop", "Event loop gecikmesi"),
+    ):
+        rows = sorted(
+            ((name, h) for (k, name), h in METRICS.items() if k == kind),
+            key=lambda x: x[1].total,
+            reverse=True,
+        )[:limit]
+        if not rows:
+            continue
+        text += f"\n<b>{title}</b>\n"
+        for name, h in rows:
+            avg = h.total / h.count * 1000 if h.count else 0
+            text += f"{html.escape(name)} — {h.count} / {avg:.1f} ms / ≤{h.quantile(0.95):g} ms / {h.errors}\n"
+    return text
+
+
+_rss_history: deque = deque(maxlen=120)
+_loop_lag_max = 0.0
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+async def monitor_loop_lag() -> None:
+    global _loop_lag_max
+
+    last_rss = 0.0
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, time.perf_counter() - t0 - LOOP_LAG_INTERVAL)
+        observe("loop", "lag", lag)
+        _loop_lag_max = max(_loop_lag_max, lag)
+
+        if time.monotonic() - last_rss >= 30:
+            last_rss = time.monotonic()
+            _rss_history.append((int(time.time()), rss_bytes()))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> str:
+    own: dict[str, int] = {}
+    total: dict[str, int] = {}
+    samples = 0
+
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = f"{Path(code.co_filename).name}:{code.co_firstlineno} {code.co_name}"
+                if leaf:
+                    own[key] = own.get(key, 0) + 1
+                    leaf = False
+                if key not in seen:
+                    seen.add(key)
+                    total[key] = total.get(key, 0) + 1
+                frame = frame.f_back
+        time.sleep(interval)
+
+    lines = [f"CPU örnekleme: {seconds:g} sn, {samples} örnek, {interval * 1000:g} ms aralık", ""]
+    for title, counts in (("Kendi süresi (en üstteki fonksiyon)", own), ("Toplam süre (çağrı zincirinde)", total)):
+        lines.append(title)
+        for key, n in sorted(counts.items(), key=lambda x: x[1], reverse=True)[:30]:
+            lines.append(f"{n / max(samples, 1) * 100:6.1f}%  {n:6d}  {key}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def memory_report(limit: int = 25) -> str:
+    global _last_snapshot
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"tracemalloc: şu an {_mb(current)}, tepe {_mb(peak)}, RSS {_mb(rss_bytes())}", ""]
+
+    lines.append("En çok bellek ayıran satırlar")
+    for stat in snapshot.statistics("lineno")[:limit]:
+        lines.append(f"{stat.size / 1024:10.1f} KB  {stat.count:8d}  {stat.traceback}")
+
+    if _last_snapshot is not None:
+        lines.append("")
+        lines.append("Önceki snapshot'tan bu yana büyüme")
+        for stat in snapshot.compare_to(_last_snapshot, "lineno")[:limit]:
+            lines.append(f"{stat.size_diff / 1024:+10.1f} KB  {stat.count_diff:+8d}  {stat.traceback}")
+
+    _last_snapshot = snapshot
+    return "\n".join(lines)
+
+
+def profile_summary(app: Application) -> str:
+    lag = METRICS.get(("loop", "lag"))
+    data = load_data()
+    analytics = data["analytics"]
+
+    text = "🩺 <b>PROFİL</b>\n\n"
+    text += f"Çalışma süresi: {int(time.perf_counter() - BOOT_T0)} sn\n"
+    if lag and lag.count:
+        text += (
+            f"Event loop gecikmesi: p50 ≤{lag.quantile(0.5):g} ms, p95 ≤{lag.quantile(0.95):g} ms, "
+            f"en kötü {_loop_lag_max * 1000:.0f} ms\n"
+        )
+    else:
+        text += "Event loop gecikmesi: henüz ölçülmedi\n"
+
+    text += f"\nRSS: {_mb(rss_bytes())}\n"
+    if len(_rss_history) > 1:
+        (t0, r0), (t1, r1) = _rss_history[0], _rss_history[-1]
+        text += f"RSS değişimi: {(r1 - r0) / 1024 / 1024:+.1f} MB / {(t1 - t0) // 60} dk\n"
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        text += f"tracemalloc: açık, {_mb(current)} (tepe {_mb(peak)})\n"
+    else:
+        text += "tracemalloc: kapalı\n"
+
+    text += f"\nGörev: {len(asyncio.all_tasks())}  Thread: {threading.active_count()}\n"
+    text += f"GC sayaçları: {gc.get_count()}\n"
+    text += f"user_data: {len(app.user_data)}  chat_data: {len(app.chat_data)}\n"
+    text += f"Kullanıcı: {len(data['started_users'])}  Flood LRU: {len(FLOOD_GATE.users)}\n"
+    text += (
+        f"Analiz: {len(analytics['hourly'])} saatlik gün, {len(analytics['daily'])} günlük, "
+        f"{len(analytics['weekly'])} hafta, {sum(len(x) for x in analytics['uniques'].get('hour', {}).values())} saatlik sketch\n"
+    )
+    text += f"Menü önbelleği: {len(_menu_cache)}  Tıklama tamponu: {len(_click_buffer)}\n"
 
+    text += (
+        "\n<code>/profil cpu 10</code> — CPU örnekleme (dosya)\n"
+        "<code>/profil mem</code> — tracemalloc snapshot (dosya)\n"
+        "<code>/profil mem stop</code> — tracemalloc kapat"
+    )
+    return text
 
-def load_data() -> dict:
-    ensure_data_file()
-    with DATA_FILE.open("r", encoding="utf-8") as f:
-        data = json.load(f)
 
+def default_data() -> dict:
+    return {
+        "quick": [],
+        "channels": copy.deepcopy(DEFAULT_CHANNELS),
+        "sites": copy.deepcopy(DEFAULT_SITES),
+        "started_users": [],
+        "analytics": {
+            "hourly": {}
+        },
+    }
+
+
+def _normalize_data(data: dict) -> dict:
     data.setdefault("quick", [])
     data.setdefault("channels", [])
     data.setdefault("sites", [])
     data.setdefault("started_users", [])
     data.setdefault("analytics", {})
     data["analytics"].setdefault("hourly", {})
+    data["analytics"].setdefault("daily", {})
+    data["analytics"].setdefault("buttons", {})
+    data["analytics"].setdefault("weekly", {})
+    data["analytics"].setdefault("throttled", {})
+    data["analytics"]["uniques"] = _map_sketches(data["analytics"].get("uniques", {}), HyperLogLog.from_json)
+    data.setdefault("version", 0)
+
+    if not isinstance(data["started_users"], AudienceIndex):
+        data["started_users"] = AudienceIndex.from_json(data["started_users"], data.pop("user_seen", None))
     return data
 
 
-def register_started_user(user_id: int) -> None:
-    data = load_data()
-    users = set()
+def _to_json_doc(data: dict) -> dict:
+    doc = dict(data)
+    users = doc.get("started_users")
+    if isinstance(users, AudienceIndex):
+        doc["started_users"], doc["user_seen"] = users.to_json()
+
+    analytics = doc.get("analytics")
+    if analytics and "uniques" in analytics:
+        doc["analytics"] = dict(analytics)
+        doc["analytics"]["uniques"] = _map_sketches(analytics["uniques"], HyperLogLog.to_json)
+    return doc
+
+
+def _write_atomic(path: Path, payload) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(payload.encode("utf-8") if isinstance(payload, str) else payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _apply_event(data: dict, event: dict) -> None:
+    kind = event.get("t")
+
+    if kind == "start":
+        data["started_users"].add(int(event["u"]), int(event["ts"]))
+        return
+
+    if kind == "inactive":
+        for uid in event["u"]:
+            data["started_users"].deactivate(int(uid))
+        return
+
+    if kind == "clicks":
+        for day, hour, button, n in event["c"]:
+            _add_clicks(data["analytics"], day, hour, button, int(n))
+        for day, hour, button, uid in event.get("s", []):
+            _add_unique(data["analytics"], day, hour, button, int(uid))
+        for day, reason, n in event.get("d", []):
+            dropped = data["analytics"]["throttled"].setdefault(day, {})
+            dropped[reason] = dropped.get(reason, 0) + int(n)
+        return
+
+    if kind == "click":
+        now = datetime.fromtimestamp(event["ts"], TZ)
+        day, hour, button = now.strftime("%Y-%m-%d"), now.strftime("%H"), event.get("k", "")
+        _add_clicks(data["analytics"], day, hour, button, 1)
+        _add_unique(data["analytics"], day, hour, button, int(event["u"]))
 
-    for x in data.get("started_users", []):
+
+def _week_key(day: str) -> str:
+    year, week, _ = datetime.strptime(day, "%Y-%m-%d").isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _add_clicks(analytics: dict, day: str, hour: str, button: str, n: int) -> None:
+    hourly = analytics["hourly"].setdefault(day, {})
+    hourly[hour] = int(hourly.get(hour, 0)) + n
+
+    analytics["daily"][day] = int(analytics["daily"].get(day, 0)) + n
+
+    buttons = analytics["buttons"].setdefault(day, {})
+    buttons[button] = int(buttons.get(button, 0)) + n
+
+    week = analytics["weekly"].setdefault(_week_key(day), {"total": 0, "buttons": {}})
+    week["total"] = int(week["total"]) + n
+    week["buttons"][button] = int(week["buttons"].get(button, 0)) + n
+
+
+def _sketch(bucket: dict, key: str) -> HyperLogLog:
+    sketch = bucket.get(key)
+    if sketch is None:
+        sketch = bucket[key] = HyperLogLog()
+    return sketch
+
+
+def _add_unique(analytics: dict, day: str, hour: str, button: str, uid: int) -> None:
+    uniques = analytics["uniques"]
+    _sketch(uniques["hour"].setdefault(day, {}), hour).add(uid)
+    _sketch(uniques["day"], day).add(uid)
+    _sketch(uniques["button"].setdefault(day, {}), button).add(uid)
+
+
+def unique_count(analytics: dict, days: list[str], button: Optional[str] = None) -> int:
+    uniques = analytics["uniques"]
+    merged = HyperLogLog()
+    for day in days:
+        sketch = uniques["day"].get(day) if button is None else uniques["button"].get(day, {}).get(button)
+        if sketch is not None:
+            merged.merge(sketch)
+    return merged.count()
+
+
+def analytics_cutoffs(today: Optional[datetime] = None) -> Tuple[str, str]:
+    today = today or datetime.now(TZ)
+    hourly_oldest = (today - timedelta(days=ANALYTICS_HOURLY_DAYS - 1)).strftime("%Y-%m-%d")
+    daily_oldest = (today - timedelta(days=ANALYTICS_DAILY_DAYS - 1)).strftime("%Y-%m-%d")
+    return hourly_oldest, daily_oldest
+
+
+def prune_analytics(analytics: dict, today: Optional[datetime] = None) -> None:
+    hourly_oldest, daily_oldest = analytics_cutoffs(today)
+
+    for key, oldest in (
+        ("hourly", hourly_oldest),
+        ("daily", daily_oldest),
+        ("buttons", daily_oldest),
+        ("throttled", daily_oldest),
+    ):
+        for day in [d for d in analytics[key] if d < oldest]:
+            del analytics[key][day]
+
+    weeks = sorted(analytics["weekly"])
+    for week in weeks[:-ANALYTICS_WEEKLY_WEEKS]:
+        del analytics["weekly"][week]
+
+    uniques = analytics["uniques"]
+    for key, oldest in (("hour", hourly_oldest), ("day", daily_oldest), ("button", daily_oldest)):
+        for day in [d for d in uniques[key] if d < oldest]:
+            del uniques[key][day]
+
+
+def top_buttons_from(analytics: dict, days: list[str], limit: int = 5) -> list[Tuple[str, int]]:
+    totals: dict[str, int] = {}
+    for day in days:
+        for button, n in analytics["buttons"].get(day, {}).items():
+            if button:
+                totals[button] = totals.get(button, 0) + int(n)
+    return sorted(totals.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+
+class JsonStorage:
+    def __init__(self, path: Path, events_path: Path) -> None:
+        self.path = path
+        self.events_path = events_path
+        self.lock_path = path.with_name(path.name + ".lock")
+        self._cache: Optional[dict] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._gen = 0
+        self._journal_offset = 0
+        self._journal_fh = None
+        self._lock_fh = None
+        self._lock_depth = 0
+        self._thread_lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                if self._lock_fh is None:
+                    self._lock_fh = self.lock_path.open("a")
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_UN)
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _journal_path(self, gen: Optional[int] = None) -> Path:
+        gen = self._gen if gen is None else gen
+        return self.events_path.with_name(f"{self.events_path.stem}.{gen}{self.events_path.suffix}")
+
+    def _journal_size(self) -> int:
+        try:
+            return self._journal_path().stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _close_journal(self) -> None:
+        if self._journal_fh is not None:
+            self._journal_fh.close()
+            self._journal_fh = None
+
+    def _replay_legacy_journal(self, data: dict) -> None:
+        applied = int(data.pop("journal_seq", 0))
+        if not self.events_path.exists():
+            return
+
+        with self.events_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except Exception:
+                    continue
+                if int(event.get("seq", 0)) > applied:
+                    _apply_event(data, event)
+
+    def _tail_journal(self, data: dict) -> None:
+        try:
+            with self._journal_path().open("rb") as f:
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except Exception:
+                continue
+            _apply_event(data, event)
+        self._journal_offset += end
+
+    def _write_snapshot(self, data: dict) -> None:
+        gen = self._gen + 1
+        data["journal_gen"] = gen
+        data["version"] = int(data.get("version", 0)) + 1
+        _write_atomic(self.path, json.dumps(_to_json_doc(data), ensure_ascii=False, separators=(",", ":")))
+
+        self._close_journal()
+        pattern = f"{self.events_path.stem}.*{self.events_path.suffix}"
+        for old in self.events_path.parent.glob(pattern):
+            old_gen = old.name[len(self.events_path.stem) + 1:-len(self.events_path.suffix) or None]
+            if old_gen.isdigit() and int(old_gen) < gen:
+                old.unlink(missing_ok=True)
+        self.events_path.unlink(missing_ok=True)
+
+        self._gen = gen
+        self._journal_offset = 0
+        self._cache = _normalize_data(data)
+        self._stamp = self._file_stamp()
+
+    def _refresh(self) -> dict:
+        stamp = self._file_stamp()
+        if stamp is None:
+            self._write_snapshot(default_data())
+            stamp = self._stamp
+
+        if self._cache is None or stamp != self._stamp:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = _normalize_data(json.load(f))
+
+            self._close_journal()
+            self._gen = int(data.get("journal_gen", 0))
+            self._journal_offset = 0
+            self._replay_legacy_journal(data)
+            self._cache = data
+            self._stamp = stamp
+
+        self._tail_journal(self._cache)
+        return self._cache
+
+    def load(self) -> dict:
+        if (
+            self._cache is not None
+            and self._file_stamp() == self._stamp
+            and self._journal_size() == self._journal_offset
+        ):
+            return self._cache
+
+        with self._locked():
+            return self._refresh()
+
+    def save(self, data: dict, expected_version: Optional[int] = None) -> bool:
+        with self._locked():
+            if expected_version is not None:
+                if self._file_stamp() != self._stamp or int(data.get("version", 0)) != expected_version:
+                    return False
+                self._tail_journal(data)
+            self._write_snapshot(data)
+            return True
+
+    def invalidate(self) -> None:
+        self._cache = None
+
+    def append(self, event: dict) -> None:
+        line = (json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+        with self._locked():
+            self._refresh()
+            if self._journal_fh is None:
+                self._journal_fh = self._journal_path().open("ab")
+
+            size = self._journal_fh.seek(0, os.SEEK_END)
+            if size != self._journal_offset:
+                self._journal_fh.write(b"\n")
+                size += 1
+            self._journal_fh.write(line)
+            self._journal_fh.flush()
+            self._journal_offset = size + len(line)
+
+    def needs_compaction(self) -> bool:
+        return self._journal_offset >= JOURNAL_MAX_BYTES
+
+    def compact(self) -> None:
+        with self._locked():
+            data = self._refresh()
+            if self._journal_offset or self.events_path.exists():
+                prune_analytics(data["analytics"])
+                self._write_snapshot(data)
+
+    def broadcast_targets(self) -> list[int]:
+        return self.load()["started_users"].active_ids()
+
+    def top_buttons(self, days: list[str], limit: int = 5) -> list[Tuple[str, int]]:
+        return top_buttons_from(self.load()["analytics"], days, limit)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    cat TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (cat, pos)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    first_seen INTEGER NOT NULL DEFAULT 0,
+    last_seen INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS clicks_hourly (
+    day TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS clicks_daily (
+    day TEXT NOT NULL,
+    button TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, button)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS clicks_weekly (
+    week TEXT NOT NULL,
+    button TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (week, button)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sketches (
+    kind TEXT NOT NULL,
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    regs BLOB NOT NULL,
+    PRIMARY KEY (kind, day, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS throttled_daily (
+    day TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, reason)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    body TEXT NOT NULL
+);
+"""
+
+SQLITE_DOC_KEYS = ("quick", "channels", "sites", "started_users", "analytics", "journal_seq", "journal_gen", "user_seen")
+
+
+class SqliteStorage:
+    def __init__(self, path: Path) -> None:
+        import sqlite3
+
+        self.path = path
+        self.db = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SQLITE_SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(users)")}
+        if "active" not in columns:
+            self.db.execute("ALTER TABLE users ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+        self._cache: Optional[dict] = None
+        self._data_version: Optional[int] = None
+        self._event_seq = 0
+        self._own_events: set[int] = set()
+
+    def _version(self) -> int:
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self) -> dict:
+        version = self._version()
+        if self._cache is not None and version == self._data_version:
+            return self._cache
+
+        if self._cache is not None and self._catch_up():
+            self._data_version = version
+            return self._cache
+
+        db = self.db
+        if db.execute("SELECT COUNT(*) FROM meta WHERE key = 'initialized'").fetchone()[0] == 0:
+            self.save(default_data())
+
+        db.execute("BEGIN")
+        try:
+            data = self._read_document()
+            self._event_seq = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        finally:
+            db.execute("COMMIT")
+
+        self._own_events.clear()
+        self._cache = _normalize_data(data)
+        self._data_version = self._version()
+        return self._cache
+
+    def _catch_up(self) -> bool:
+        db = self.db
+        db.execute("BEGIN")
         try:
-            users.add(int(x))
+            first = db.execute("SELECT MIN(id) FROM events").fetchone()[0]
+            if first is not None and first > self._event_seq + 1:
+                return False
+            rows = db.execute(
+                "SELECT id, body FROM events WHERE id > ? ORDER BY id", (self._event_seq,)
+            ).fetchall()
+
+            row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row and int(json.loads(row[0])) != int(self._cache.get("version", 0)):
+                data = dict(self._cache)
+                data.update(self._read_links())
+                self._cache = data
+        finally:
+            db.execute("COMMIT")
+
+        for seq, body in rows:
+            if seq in self._own_events:
+                self._own_events.discard(seq)
+            else:
+                _apply_event(self._cache, json.loads(body))
+            self._event_seq = seq
+        return True
+
+    def _read_links(self) -> dict:
+        db = self.db
+        data = {cat: [] for cat in ("quick", "channels", "sites")}
+        for cat, title, url in db.execute("SELECT cat, title, url FROM links ORDER BY cat, pos"):
+            data.setdefault(cat, []).append([title, url])
+
+        for key, value in db.execute("SELECT key, value FROM meta WHERE key != 'initialized'"):
+            data[key] = json.loads(value)
+        return data
+
+    def _read_document(self) -> dict:
+        db = self.db
+        data = self._read_links()
+
+        users = AudienceIndex()
+        for uid, first, last, active in db.execute(
+            "SELECT id, first_seen, last_seen, active FROM users ORDER BY id"
+        ):
+            users.ids.append(uid)
+            users.first_seen.append(first)
+            users.last_seen.append(last)
+            users.active.append(1 if active else 0)
+        data["started_users"] = users
+
+        analytics = {"hourly": {}, "daily": {}, "buttons": {}, "weekly": {}, "throttled": {}}
+        for day, hour, n in db.execute("SELECT day, hour, n FROM clicks_hourly"):
+            analytics["hourly"].setdefault(day, {})[hour] = n
+        for day, button, n in db.execute("SELECT day, button, n FROM clicks_daily"):
+            analytics["buttons"].setdefault(day, {})[button] = n
+            analytics["daily"][day] = analytics["daily"].get(day, 0) + n
+        for week, button, n in db.execute("SELECT week, button, n FROM clicks_weekly"):
+            bucket = analytics["weekly"].setdefault(week, {"total": 0, "buttons": {}})
+            bucket["buttons"][button] = n
+            bucket["total"] += n
+        for day, reason, n in db.execute("SELECT day, reason, n FROM throttled_daily"):
+            analytics["throttled"].setdefault(day, {})[reason] = n
+
+        uniques = {"hour": {}, "day": {}, "button": {}}
+        for kind, day, name, regs in db.execute("SELECT kind, day, name, regs FROM sketches"):
+            sketch = HyperLogLog.from_bytes(regs)
+            if kind == "day":
+                uniques["day"][day] = sketch
+            else:
+                uniques[kind].setdefault(day, {})[name] = sketch
+        analytics["uniques"] = uniques
+        data["analytics"] = analytics
+        return data
+
+    def save(self, data: dict, expected_version: Optional[int] = None) -> bool:
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            current = int(json.loads(row[0])) if row else 0
+            if expected_version is not None and current != expected_version:
+                db.execute("ROLLBACK")
+                return False
+            data["version"] = current + 1
+
+            db.execute("DELETE FROM links")
+            db.executemany(
+                "INSERT INTO links (cat, pos, title, url) VALUES (?, ?, ?, ?)",
+                [
+                    (cat, pos, title, url)
+                    for cat in ("quick", "channels", "sites")
+                    for pos, (title, url) in enumerate(data.get(cat, []))
+                ],
+            )
+            db.execute("DELETE FROM meta")
+            db.execute("INSERT INTO meta (key, value) VALUES ('initialized', '1')")
+            db.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [
+                    (key, json.dumps(value, ensure_ascii=False))
+                    for key, value in data.items()
+                    if key not in SQLITE_DOC_KEYS
+                ],
+            )
+            db.execute("COMMIT")
         except Exception:
-            pass
+            db.execute("ROLLBACK")
+            raise
 
-    users.add(int(user_id))
-    data["started_users"] = sorted(users)
-    save_data(data)
+        self._cache = _normalize_data(data)
+        self._data_version = self._version()
+        return True
 
+    def invalidate(self) -> None:
+        self._cache = None
+
+    def _write_event(self, event: dict) -> None:
+        db = self.db
+        kind = event.get("t")
+
+        if kind == "start":
+            db.execute(
+                "INSERT INTO users (id, first_seen, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_seen = max(last_seen, excluded.last_seen), active = 1",
+                (int(event["u"]), int(event["ts"]), int(event["ts"])),
+            )
+            return
+
+        if kind == "inactive":
+            db.executemany("UPDATE users SET active = 0 WHERE id = ?", [(int(uid),) for uid in event["u"]])
+            return
+
+        if kind == "clicks":
+            rows = [(day, hour, button, int(n)) for day, hour, button, n in event["c"]]
+            db.executemany(
+                "INSERT INTO clicks_hourly (day, hour, n) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, hour) DO UPDATE SET n = n + excluded.n",
+                [(day, hour, n) for day, hour, _, n in rows],
+            )
+            db.executemany(
+                "INSERT INTO clicks_daily (day, button, n) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, button) DO UPDATE SET n = n + excluded.n",
+                [(day, button, n) for day, _, button, n in rows],
+            )
+            db.executemany(
+                "INSERT INTO clicks_weekly (week, button, n) VALUES (?, ?, ?) "
+                "ON CONFLICT(week, button) DO UPDATE SET n = n + excluded.n",
+                [(_week_key(day), button, n) for day, _, button, n in rows],
+            )
+            db.executemany(
+                "INSERT INTO throttled_daily (day, reason, n) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, reason) DO UPDATE SET n = n + excluded.n",
+                [(day, reason, int(n)) for day, reason, n in event.get("d", [])],
+            )
+
+            touched: dict[Tuple[str, str, str], list[int]] = {}
+            for day, hour, button, uid in event.get("s", []):
+                for key in (("hour", day, hour), ("day", day, ""), ("button", day, button)):
+                    touched.setdefault(key, []).append(int(uid))
+            for (kind, day, name), uids in touched.items():
+                row = db.execute(
+                    "SELECT regs FROM sketches WHERE kind = ? AND day = ? AND name = ?", (kind, day, name)
+                ).fetchone()
+                sketch = HyperLogLog.from_bytes(row[0]) if row else HyperLogLog()
+                for uid in uids:
+                    sketch.add(uid)
+                db.execute(
+                    "INSERT OR REPLACE INTO sketches (kind, day, name, regs) VALUES (?, ?, ?, ?)",
+                    (kind, day, name, sketch.to_bytes()),
+                )
+
+    def append(self, event: dict) -> None:
+        self.append_many([event])
+
+    def append_many(self, events: list[dict]) -> None:
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            seqs = []
+            for event in events:
+                self._write_event(event)
+                cur = db.execute(
+                    "INSERT INTO events (body) VALUES (?)",
+                    (json.dumps(event, ensure_ascii=False, separators=(",", ":")),),
+                )
+                seqs.append(cur.lastrowid)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+        for seq in seqs:
+            if seq == self._event_seq + 1:
+                self._event_seq = seq
+            else:
+                self._own_events.add(seq)
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def compact(self) -> None:
+        prune_analytics(self.load()["analytics"])
+        hourly_oldest, daily_oldest = analytics_cutoffs()
+
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM clicks_hourly WHERE day < ?", (hourly_oldest,))
+            db.execute("DELETE FROM clicks_daily WHERE day < ?", (daily_oldest,))
+            db.execute("DELETE FROM throttled_daily WHERE day < ?", (daily_oldest,))
+            db.execute("DELETE FROM sketches WHERE kind = 'hour' AND day < ?", (hourly_oldest,))
+            db.execute("DELETE FROM sketches WHERE day < ?", (daily_oldest,))
+            db.execute(
+                "DELETE FROM clicks_weekly WHERE week NOT IN "
+                "(SELECT DISTINCT week FROM clicks_weekly ORDER BY week DESC LIMIT ?)",
+                (ANALYTICS_WEEKLY_WEEKS,),
+            )
+            db.execute(
+                "DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?", (SQLITE_EVENTS_KEEP,)
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def broadcast_targets(self) -> list[int]:
+        return [uid for (uid,) in self.db.execute("SELECT id FROM users WHERE active = 1 ORDER BY id")]
+
+    def top_buttons(self, days: list[str], limit: int = 5) -> list[Tuple[str, int]]:
+        marks = ",".join("?" * len(days))
+        return self.db.execute(
+            f"SELECT button, SUM(n) AS total FROM clicks_daily "
+            f"WHERE day IN ({marks}) AND button != '' GROUP BY button ORDER BY total DESC LIMIT ?",
+            (*days, limit),
+        ).fetchall()
+
+
+def migrate_json_to_sqlite(json_path: Path, events_path: Path, target: SqliteStorage) -> bool:
+    if not json_path.exists():
+        return False
+
+    data = JsonStorage(json_path, events_path).load()
+    analytics = data["analytics"]
+    users = data["started_users"]
+
+    rows = []
+    for day in set(analytics["hourly"]) | set(analytics["daily"]):
+        hours = analytics["hourly"].get(day, {})
+        buttons = analytics["buttons"].get(day, {})
+        total = max(int(analytics["daily"].get(day, 0)), sum(int(n) for n in hours.values()))
+        rest = total - sum(int(n) for n in buttons.values())
+        for button, n in buttons.items():
+            rows.append((day, button, int(n)))
+        if rest > 0:
+            rows.append((day, "", rest))
+
+    db = target.db
+    target.save(data)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.executemany(
+            "INSERT OR REPLACE INTO users (id, first_seen, last_seen, active) VALUES (?, ?, ?, ?)",
+            zip(users.ids, users.first_seen, users.last_seen, users.active),
+        )
+        db.executemany(
+            "INSERT OR REPLACE INTO clicks_hourly (day, hour, n) VALUES (?, ?, ?)",
+            [(day, hour, int(n)) for day, hours in analytics["hourly"].items() for hour, n in hours.items()],
+        )
+        db.executemany("INSERT OR REPLACE INTO clicks_daily (day, button, n) VALUES (?, ?, ?)", rows)
+        db.executemany(
+            "INSERT OR REPLACE INTO throttled_daily (day, reason, n) VALUES (?, ?, ?)",
+            [(day, reason, int(n)) for day, reasons in analytics["throttled"].items() for reason, n in reasons.items()],
+        )
+        db.executemany(
+            "INSERT OR REPLACE INTO clicks_weekly (week, button, n) VALUES (?, ?, ?)",
+            [
+                (week, button, int(n))
+                for week, bucket in analytics["weekly"].items()
+                for button, n in bucket.get("buttons", {}).items()
+            ],
+        )
+        uniques = analytics["uniques"]
+        db.executemany(
+            "INSERT OR REPLACE INTO sketches (kind, day, name, regs) VALUES (?, ?, ?, ?)",
+            [("day", day, "", x.to_bytes()) for day, x in uniques["day"].items()]
+            + [("hour", day, h, x.to_bytes()) for day, hours in uniques["hour"].items() for h, x in hours.items()]
+            + [("button", day, b, x.to_bytes()) for day, btns in uniques["button"].items() for b, x in btns.items()],
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+    target._cache = None
+    return True
+
+
+def open_storage():
+    backend = os.getenv("STORAGE_BACKEND", "json").strip().lower()
+    if backend == "sqlite":
+        fresh = not SQLITE_FILE.exists()
+        storage = SqliteStorage(SQLITE_FILE)
+        if fresh:
+            migrate_json_to_sqlite(DATA_FILE, EVENTS_FILE, storage)
+        return storage
+    return JsonStorage(DATA_FILE, EVENTS_FILE)
+
+
+STORAGE = open_storage()
+_storage_lock = threading.RLock()
+
+
+@timed("storage", "load_data")
+def load_data() -> dict:
+    global _loaded_data
+
+    with _storage_lock:
+        data = STORAGE.load()
+        if data is not _loaded_data:
+            _loaded_data = data
+            bump_menu_version()
+        return data
+
+
+def menu_data() -> dict:
+    # Menus only read links; while a flush or compaction holds the lock, the last document is good enough.
+    if _storage_lock.acquire(blocking=False):
+        try:
+            return load_data()
+        finally:
+            _storage_lock.release()
+    return _loaded_data if _loaded_data is not None else load_data()
+
+
+@timed("storage", "update_data")
+def update_data(mutate):
+    global _loaded_data
+
+    with _storage_lock:
+        for _ in range(STORAGE_CAS_RETRIES):
+            data = load_data()
+            version = int(data.get("version", 0))
+            result = mutate(data)
+            if STORAGE.save(data, version):
+                _loaded_data = data
+                return result
+            STORAGE.invalidate()
+
+    raise RuntimeError("Veri kaydedilemedi: eşzamanlı yazma çakışması sürüyor.")
+
+
+def bump_menu_version() -> None:
+    global _menu_version
+    _menu_version += 1
+
+
+@timed("storage", "append_event")
+def append_event(event: dict) -> None:
+    with _storage_lock:
+        STORAGE.append(event)
+        _apply_event(load_data(), event)
+
+        if STORAGE.needs_compaction():
+            compact_storage()
+
+
+@timed("storage", "compact")
+def compact_storage() -> None:
+    with _storage_lock:
+        flush_clicks()
+        STORAGE.compact()
+
+
+def register_started_user(user_id: int) -> None:
+    append_event({"t": "start", "u": int(user_id), "ts": int(time.time())})
+
+
+def mark_users_inactive(user_ids: list[int]) -> None:
+    if user_ids:
+        append_event({"t": "inactive", "u": [int(uid) for uid in user_ids], "ts": int(time.time())})
+
+
+def flush_clicks() -> None:
+    global _click_buffer, _click_seen, _throttle_buffer, _click_buffered
+
+    with _click_lock:
+        if not _click_buffer and not _throttle_buffer:
+            return
+
+        clicks, seen, dropped = _click_buffer, _click_seen, _throttle_buffer
+        _click_buffer, _click_seen, _throttle_buffer = {}, set(), {}
+        _click_buffered = 0
+
+    event = {
+        "t": "clicks",
+        "c": [[day, hour, button, n] for (day, hour, button), n in clicks.items()],
+        "s": [list(x) for x in seen],
+        "ts": int(time.time()),
+    }
+    if dropped:
+        event["d"] = [[day, reason, n] for (day, reason), n in dropped.items()]
+    append_event(event)
+
+
+def track_click(user_id: int, button_key: str) -> bool:
+    global _click_buffered
 
-def track_click(user_id: int, button_key: str) -> None:
-    data = load_data()
     now = datetime.now(TZ)
-    day = now.strftime("%Y-%m-%d")
-    hour = now.strftime("%H")
+    key = (now.strftime("%Y-%m-%d"), now.strftime("%H"), button_key)
+    with _click_lock:
+        _click_buffer[key] = _click_buffer.get(key, 0) + 1
+        _click_seen.add(key + (int(user_id),))
+        _click_buffered += 1
+        return _click_buffered >= CLICK_FLUSH_EVERY
+
+
+class FloodGate:
+    __slots__ = ("rate", "burst", "window", "capacity", "users")
+
+    def __init__(self, rate: float, burst: float, window: float, capacity: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.capacity = capacity
+        self.users: "OrderedDict[int, list]" = OrderedDict()
+
+    def check(self, uid: int, key: str, now: Optional[float] = None) -> Optional[str]:
+        now = time.monotonic() if now is None else now
+        state = self.users.get(uid)
+        if state is None:
+            state = self.users[uid] = [self.burst, now, None, 0.0]
+            if len(self.users) > self.capacity:
+                self.users.popitem(last=False)
+        else:
+            self.users.move_to_end(uid)
+
+        tokens, last, last_key, last_key_at = state
+        if key == last_key and now - last_key_at < self.window:
+            return "dup"
+
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        state[1] = now
+        if tokens < 1:
+            state[0] = tokens
+            return "rate"
+
+        state[0] = tokens - 1
+        state[2] = key
+        state[3] = now
+        return None
+
+
+FLOOD_GATE = FloodGate(THROTTLE_RATE, THROTTLE_BURST, THROTTLE_WINDOW, THROTTLE_USERS)
+
+
+def count_throttled(reason: str) -> None:
+    key = (datetime.now(TZ).strftime("%Y-%m-%d"), reason)
+    with _click_lock:
+        _throttle_buffer[key] = _throttle_buffer.get(key, 0) + 1
+        _throttled_total[reason] = _throttled_total.get(reason, 0) + 1
+
+
+def throttled(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if THROTTLE_RATE > 0 and user is not None and not is_admin(user.id):
+            if update.callback_query:
+                key = update.callback_query.data or ""
+            else:
+                key = update.message.text if update.message else ""
+            reason = FLOOD_GATE.check(user.id, key)
+            if reason:
+                count_throttled(reason)
+                if update.callback_query:
+                    with contextlib.suppress(TelegramError):
+                        await update.callback_query.answer()
+                return
+        return await handler(update, context)
+
+    return wrapper
+
+
+FLOW_KEYS = ("add_flow", "broadcast_flow", "import_flow")
+
+
+class FlowPersistence(BasePersistence):
+    def __init__(self, path: Path) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=FLOW_PERSIST_SECONDS,
+        )
+        self.path = path
+        self.flows: dict[int, dict] = {}
+        self.changed: set[int] = set()
 
-    analytics = data.get("analytics", {})
-    hourly = analytics.get("hourly", {})
+        if path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+                self.flows = {int(uid): flows for uid, flows in raw.items()}
+            except Exception:
+                self.flows = {}
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return copy.deepcopy(self.flows)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        flows = {k: data[k] for k in FLOW_KEYS if data.get(k)}
+        if flows == self.flows.get(user_id, {}):
+            return
+        if flows:
+            self.flows[user_id] = copy.deepcopy(flows)
+        else:
+            self.flows.pop(user_id, None)
+        self.changed.add(user_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if self.flows.pop(user_id, None) is not None:
+            self.changed.add(user_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if not self.changed:
+            return
+        changes = {uid: copy.deepcopy(self.flows.get(uid)) for uid in self.changed}
+        self.changed = set()
+        await asyncio.to_thread(self._merge, changes)
+
+    def _merge(self, changes: dict[int, Optional[dict]]) -> None:
+        # Other workers write the same file; only our own users are replaced.
+        with open(self.path.with_suffix(".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                on_disk = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                on_disk = {}
+            for uid, flows in changes.items():
+                if flows:
+                    on_disk[str(uid)] = flows
+                else:
+                    on_disk.pop(str(uid), None)
+            _write_atomic(self.path, json.dumps(on_disk, ensure_ascii=False, separators=(",", ":")))
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
 
-    hourly.setdefault(day, {})
-    hourly[day][hour] = int(hourly[day].get(hour, 0)) + 1
+    async def update_callback_data(self, data) -> None:
+        pass
 
-    analytics["hourly"] = hourly
-    data["analytics"] = analytics
-    save_data(data)
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+
+_user_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def serialized_per_user(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args):
+        uid = update.effective_user.id if update.effective_user else 0
+        lock = _user_locks.get(uid)
+        if lock is None:
+            lock = asyncio.Lock()
+            _user_locks[uid] = lock
+
+        async with lock:
+            return await handler(update, context, *args)
+
+    return wrapper
 
 
 def get_admin_ids() -> set[int]:
@@ -121,21 +1776,37 @@ def is_admin(user_id: int) -> bool:
 
 
 def get_broadcast_user_ids() -> list[int]:
-    data = load_data()
-    out = []
-    for x in data.get("started_users", []):
-        try:
-            out.append(int(x))
-        except Exception:
-            pass
-    return out
+    with _storage_lock:
+        return STORAGE.broadcast_targets()
+
+
+def top_buttons(days: list[str]) -> list[Tuple[str, int]]:
+    with _storage_lock:
+        return STORAGE.top_buttons(days)
 
 
+@serialized_per_user
 async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update.effective_user.id):
         return
 
-    context.user_data["broadcast_flow"] = {"step": "photo", "file_id": None}
+    schedule = parse_broadcast_schedule((update.message.text or "").split()[1:])
+    if schedule is None:
+        await update.message.reply_text(
+            "Kullanım: /broadcast [SS:DD | YYYY-AA-GG SS:DD | auto] [süre: 90m, 2h]\n"
+            "Örnek: <code>/broadcast 21:30 2h</code>  <code>/broadcast auto</code>",
+            parse_mode="HTML",
+        )
+        return
+
+    start_at, window, auto = schedule
+    context.user_data["broadcast_flow"] = {
+        "step": "photo",
+        "file_id": None,
+        "start_at": start_at,
+        "window": window,
+        "auto": auto,
+    }
 
     await update.message.reply_text(
         "📣 <b>Broadcast başlatıldı</b>\n\n"
@@ -145,6 +1816,7 @@ async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
 
 
+@serialized_per_user
 async def handle_broadcast_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     flow = context.user_data.get("broadcast_flow")
     if not flow:
@@ -172,6 +1844,543 @@ async def handle_broadcast_photo(update: Update, context: ContextTypes.DEFAULT_T
     )
 
 
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_broadcast_bucket: Optional[TokenBucket] = None
+
+
+def broadcast_bucket() -> TokenBucket:
+    global _broadcast_bucket
+    if _broadcast_bucket is None:
+        _broadcast_bucket = TokenBucket(BROADCAST_RATE)
+    return _broadcast_bucket
+
+
+def parse_window(token: str) -> Optional[int]:
+    for suffix, seconds in (("dk", 60), ("m", 60), ("sa", 3600), ("h", 3600)):
+        if token.endswith(suffix) and token[:-len(suffix)].isdigit():
+            return int(token[:-len(suffix)]) * seconds
+    return None
+
+
+def parse_broadcast_schedule(args: list[str], now: Optional[datetime] = None) -> Optional[Tuple[Optional[int], int, bool]]:
+    now = now or datetime.now(TZ)
+    start_at = None
+    window = 0
+    auto = False
+    day = None
+    at = None
+
+    for token in args:
+        token = token.lower()
+        if token == "auto":
+            auto = True
+        elif parse_window(token) is not None:
+            window = parse_window(token)
+        elif len(token) == 10 and token[4] == "-" and token[7] == "-":
+            try:
+                day = datetime.strptime(token, "%Y-%m-%d").date()
+            except ValueError:
+                return None
+        elif ":" in token:
+            try:
+                at = datetime.strptime(token, "%H:%M").time()
+            except ValueError:
+                return None
+        else:
+            return None
+
+    if day is not None and at is None:
+        return None
+    if at is not None:
+        start = datetime.combine(day or now.date(), at, tzinfo=TZ)
+        if start <= now:
+            if day is not None:
+                return None
+            start += timedelta(days=1)
+        start_at = int(start.timestamp())
+
+    if auto and start_at is not None:
+        return None
+    if auto and not window:
+        window = BROADCAST_AUTO_WINDOW
+    return start_at, window, auto
+
+
+def quiet_start(analytics: dict, window: int, now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.now(TZ)
+    hourly = analytics.get("hourly", {})
+    if not hourly:
+        return now
+
+    totals = [0] * 24
+    for hours in hourly.values():
+        for hour, n in hours.items():
+            totals[int(hour)] += int(n)
+
+    span = max(1, math.ceil(window / 3600))
+    first = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    best = min(range(24), key=lambda k: (sum(totals[(first.hour + k + i) % 24] for i in range(span)), k))
+    return first + timedelta(hours=best)
+
+
+def shaped_rate(total: int, window: int) -> float:
+    if not window or not total:
+        return BROADCAST_RATE
+    return min(BROADCAST_RATE, max(total / window, 0.05))
+
+
+def retry_after_seconds(exc: RetryAfter) -> float:
+    wait = exc.retry_after
+    if isinstance(wait, timedelta):
+        return wait.total_seconds()
+    return float(wait)
+
+
+def broadcast_status_text(job: dict, started: float, sent_this_run: int) -> str:
+    elapsed = max(time.monotonic() - started, 0.001)
+    sent = job["ok"] + job["fail"] + job.get("blocked", 0)
+    head = {
+        "running": "📣 <b>Broadcast sürüyor...</b>",
+        "paused": "⏸ <b>Broadcast duraklatıldı.</b>",
+        "cancelled": "🛑 <b>Broadcast iptal edildi.</b>",
+        "done": "✅ <b>Broadcast bitti.</b>",
+    }.get(job["status"], "📣 <b>Broadcast</b>")
+    shaping = ""
+    if job.get("window"):
+        shaping = f"Yayılma: {job['window'] // 60} dk ({job['rate']:.2f} mesaj/sn)\n"
+    return (
+        f"{head} <code>#{job['id']}</code>\n\n"
+        f"İlerleme: <b>{sent}/{job['total']}</b>\n"
+        f"Gönderildi: {job['ok']}\n"
+        f"Engelleyen / kapalı hesap: {job.get('blocked', 0)}\n"
+        f"Geçici hata: {job['fail']}\n"
+        f"Flood bekleme: {job['flood_waits']}  Tekrar: {job['retries']}\n"
+        f"{shaping}"
+        f"Hız: {sent_this_run / elapsed:.1f} mesaj/sn  Süre: {int(elapsed)} sn"
+    )
+
+
+UNREACHABLE_ERRORS = ("chat not found", "user is deactivated", "peer_id_invalid", "bot was blocked")
+
+
+def is_unreachable(error: TelegramError) -> bool:
+    if isinstance(error, Forbidden):
+        return True
+    message = str(error).lower()
+    return isinstance(error, BadRequest) and any(x in message for x in UNREACHABLE_ERRORS)
+
+
+async def send_broadcast_one(
+    bot, shaper: Optional[TokenBucket], job: dict, uid: int, file_id: str, caption: str
+) -> str:
+    attempt = 0
+    while True:
+        if shaper is not None:
+            await shaper.acquire()
+        await broadcast_bucket().acquire()
+        try:
+            await bot.send_photo(chat_id=uid, photo=file_id, caption=caption)
+            return "ok"
+        except RetryAfter as e:
+            job["flood_waits"] += 1
+            broadcast_bucket().pause(retry_after_seconds(e))
+        except BadRequest as e:
+            return "blocked" if is_unreachable(e) else "fail"
+        except NetworkError:
+            if attempt >= BROADCAST_MAX_RETRIES:
+                return "fail"
+            job["retries"] += 1
+            await asyncio.sleep(min(2 ** attempt, 30))
+            attempt += 1
+        except TelegramError as e:
+            return "blocked" if is_unreachable(e) else "fail"
+
+
+_broadcast_jobs: dict[str, dict] = {}
+_broadcast_tasks: dict[str, asyncio.Task] = {}
+_broadcast_stopping = False
+_job_locks: dict[str, object] = {}
+
+
+def _job_meta_path(job_id: str) -> Path:
+    return BROADCAST_DIR / f"{job_id}.json"
+
+
+def _job_targets_path(job_id: str) -> Path:
+    return BROADCAST_DIR / f"{job_id}.targets"
+
+
+def save_broadcast_job(job: dict) -> None:
+    _write_atomic(_job_meta_path(job["id"]), json.dumps(job, ensure_ascii=False))
+
+
+def load_broadcast_targets(job_id: str) -> array:
+    targets = array("q")
+    targets.frombytes(_job_targets_path(job_id).read_bytes())
+    return targets
+
+
+def claim_broadcast_job(job_id: str) -> bool:
+    if job_id in _job_locks:
+        return True
+    if fcntl is None:
+        _job_locks[job_id] = None
+        return True
+
+    BROADCAST_DIR.mkdir(exist_ok=True)
+    fh = (BROADCAST_DIR / f"{job_id}.lock").open("a")
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return False
+    _job_locks[job_id] = fh
+    return True
+
+
+def release_broadcast_job(job_id: str) -> None:
+    fh = _job_locks.pop(job_id, None)
+    if fh is not None:
+        fh.close()
+
+
+def reload_broadcast_job(job: dict) -> None:
+    try:
+        job.update(json.loads(_job_meta_path(job["id"]).read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        pass
+
+
+def stop_requested(job: dict) -> Optional[str]:
+    try:
+        status = json.loads(_job_meta_path(job["id"]).read_text(encoding="utf-8")).get("status")
+    except (OSError, ValueError):
+        return None
+    return status if status in ("paused", "cancelled") else None
+
+
+def load_broadcast_jobs() -> list[dict]:
+    if not BROADCAST_DIR.exists():
+        return []
+
+    loaded = []
+    for path in sorted(BROADCAST_DIR.glob("*.json")):
+        try:
+            job = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        if job["id"] in _broadcast_jobs:
+            continue
+        _broadcast_jobs[job["id"]] = job
+        loaded.append(job)
+    return loaded
+
+
+def create_broadcast_job(
+    admin_chat_id: int,
+    file_id: str,
+    caption: str,
+    user_ids: list[int],
+    start_at: Optional[int] = None,
+    window: int = 0,
+) -> dict:
+    BROADCAST_DIR.mkdir(exist_ok=True)
+
+    job_id = datetime.now(TZ).strftime("%y%m%d%H%M%S")
+    while job_id in _broadcast_jobs or _job_meta_path(job_id).exists() or not claim_broadcast_job(job_id):
+        job_id = str(int(job_id) + 1)
+
+    _write_atomic(_job_targets_path(job_id), array("q", user_ids).tobytes())
+    scheduled = start_at is not None and start_at > time.time()
+    job = {
+        "id": job_id,
+        "status": "scheduled" if scheduled else "running",
+        "admin_chat_id": admin_chat_id,
+        "file_id": file_id,
+        "caption": caption,
+        "total": len(user_ids),
+        "cursor": 0,
+        "ahead": [],
+        "ok": 0,
+        "blocked": 0,
+        "fail": 0,
+        "flood_waits": 0,
+        "retries": 0,
+        "created": int(time.time()),
+        "start_at": start_at if scheduled else int(time.time()),
+        "pending": scheduled,
+        "window": window,
+        "rate": shaped_rate(len(user_ids), window),
+    }
+    save_broadcast_job(job)
+    _broadcast_jobs[job_id] = job
+    return job
+
+
+def start_broadcast_job(bot, job: dict) -> None:
+    task = asyncio.create_task(run_broadcast(bot, job), name=f"broadcast-{job['id']}")
+    _broadcast_tasks[job["id"]] = task
+
+    def _done(t: asyncio.Task) -> None:
+        _broadcast_tasks.pop(job["id"], None)
+        release_broadcast_job(job["id"])
+        if not t.cancelled() and t.exception():
+            print(f"Broadcast #{job['id']} hata ile durdu: {t.exception()!r}")
+
+    task.add_done_callback(_done)
+
+
+async def run_broadcast(bot, job: dict) -> None:
+    targets = load_broadcast_targets(job["id"])
+    total = len(targets)
+    done = bytearray(total)
+    for i in job.get("ahead", []):
+        done[i] = 1
+
+    job.setdefault("blocked", 0)
+    rate = job.get("rate") or BROADCAST_RATE
+    shaper = TokenBucket(rate, max(1.0, rate)) if rate < BROADCAST_RATE else None
+    started = time.monotonic()
+    sent_this_run = 0
+    since_checkpoint = 0
+    next_idx = job["cursor"]
+    unreachable: list[int] = []
+
+    def checkpoint() -> None:
+        mark_users_inactive(unreachable)
+        unreachable.clear()
+
+        cursor = job["cursor"]
+        while cursor < total and done[cursor]:
+            cursor += 1
+        job["cursor"] = cursor
+        job["ahead"] = [i for i in range(cursor, min(next_idx, total)) if done[i]]
+        job["status"] = stop_requested(job) or job["status"]
+        save_broadcast_job(job)
+
+    status = await bot.send_message(
+        job["admin_chat_id"], broadcast_status_text(job, started, 0), parse_mode="HTML"
+    )
+
+    async def worker() -> None:
+        nonlocal next_idx, sent_this_run, since_checkpoint
+
+        while job["status"] == "running" and not _broadcast_stopping:
+            while next_idx < total and done[next_idx]:
+                next_idx += 1
+            if next_idx >= total:
+                return
+
+            i = next_idx
+            next_idx += 1
+            uid = int(targets[i])
+            outcome = await send_broadcast_one(bot, shaper, job, uid, job["file_id"], job["caption"])
+            job[outcome] += 1
+            if outcome == "blocked":
+                unreachable.append(uid)
+
+            done[i] = 1
+            sent_this_run += 1
+            since_checkpoint += 1
+            if since_checkpoint >= BROADCAST_CHECKPOINT_EVERY:
+                since_checkpoint = 0
+                checkpoint()
+
+    async def reporter() -> None:
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_SECONDS)
+            try:
+                await status.edit_text(broadcast_status_text(job, started, sent_this_run), parse_mode="HTML")
+            except TelegramError:
+                pass
+
+    progress = asyncio.create_task(reporter())
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, BROADCAST_CONCURRENCY))))
+    finally:
+        progress.cancel()
+        checkpoint()
+
+    if job["cursor"] >= total and job["status"] == "running":
+        job["status"] = "done"
+    if job["status"] in ("done", "cancelled"):
+        save_broadcast_job(job)
+        _job_targets_path(job["id"]).unlink(missing_ok=True)
+
+    if _broadcast_stopping:
+        return
+
+    try:
+        await status.edit_text(broadcast_status_text(job, started, sent_this_run), parse_mode="HTML")
+    except TelegramError:
+        await bot.send_message(
+            job["admin_chat_id"], broadcast_status_text(job, started, sent_this_run), parse_mode="HTML"
+        )
+
+
+async def run_scheduled_broadcast(context: ContextTypes.DEFAULT_TYPE) -> None:
+    job = _broadcast_jobs.get(context.job.data)
+    if not job or job["status"] != "scheduled":
+        return
+    if stop_requested(job):
+        reload_broadcast_job(job)
+        release_broadcast_job(job["id"])
+        return
+
+    user_ids = get_broadcast_user_ids()
+    _write_atomic(_job_targets_path(job["id"]), array("q", user_ids).tobytes())
+    job["total"] = len(user_ids)
+    job["rate"] = shaped_rate(len(user_ids), job.get("window", 0))
+    job["status"] = "running"
+    job["pending"] = False
+    save_broadcast_job(job)
+    start_broadcast_job(bulk_bot(context.application), job)
+
+
+def schedule_broadcast_job(app: Application, job: dict) -> None:
+    app.job_queue.run_once(
+        run_scheduled_broadcast,
+        max(0.0, job["start_at"] - time.time()),
+        data=job["id"],
+        name=f"broadcast-{job['id']}",
+    )
+
+
+def unschedule_broadcast_job(app: Application, job_id: str) -> None:
+    for scheduled in app.job_queue.get_jobs_by_name(f"broadcast-{job_id}"):
+        scheduled.schedule_removal()
+    release_broadcast_job(job_id)
+
+
+async def resume_broadcast_jobs(app: Application) -> None:
+    for job in load_broadcast_jobs():
+        if job["id"] in _broadcast_tasks or job["status"] not in ("running", "scheduled"):
+            continue
+        if not claim_broadcast_job(job["id"]):
+            continue
+        if job["status"] == "running":
+            start_broadcast_job(bulk_bot(app), job)
+        elif job["status"] == "scheduled":
+            schedule_broadcast_job(app, job)
+
+
+async def stop_broadcast_jobs(app: Application) -> None:
+    global _broadcast_stopping
+
+    _broadcast_stopping = True
+    tasks = list(_broadcast_tasks.values())
+    if tasks:
+        await asyncio.wait(tasks, timeout=15)
+
+
+async def cmd_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update.effective_user.id):
+        return
+
+    parts = (update.message.text or "").strip().split()
+    if len(parts) == 1:
+        if not _broadcast_jobs:
+            await update.message.reply_text("Kayıtlı broadcast yok.")
+            return
+
+        text = "📣 <b>Broadcast Görevleri</b>\n\n"
+        for job in sorted(_broadcast_jobs.values(), key=lambda j: j["id"], reverse=True)[:20]:
+            if job["status"] == "scheduled":
+                at = datetime.fromtimestamp(job["start_at"], TZ).strftime("%Y-%m-%d %H:%M")
+                text += f"<code>#{job['id']}</code> scheduled — {at}\n"
+                continue
+            sent = job["ok"] + job["fail"] + job.get("blocked", 0)
+            text += f"<code>#{job['id']}</code> {job['status']} — {sent}/{job['total']} (hata: {job['fail']})\n"
+        text += "\n<code>/jobs pause ID</code>  <code>/jobs resume ID</code>  <code>/jobs cancel ID</code>"
+        await update.message.reply_text(text, parse_mode="HTML")
+        return
+
+    if len(parts) != 3 or parts[1] not in ("pause", "resume", "cancel"):
+        await update.message.reply_text("Kullanım: /jobs  |  /jobs pause ID  |  /jobs resume ID  |  /jobs cancel ID")
+        return
+
+    action, job_id = parts[1], parts[2].lstrip("#")
+    job = _broadcast_jobs.get(job_id)
+    if not job:
+        await update.message.reply_text("❌ Görev bulunamadı.")
+        return
+    if job_id not in _job_locks:
+        reload_broadcast_job(job)
+
+    if job["status"] in ("done", "cancelled"):
+        await update.message.reply_text(f"Bu görev zaten kapandı ({job['status']}).")
+        return
+
+    if job["status"] == "scheduled":
+        unschedule_broadcast_job(context.application, job_id)
+
+    if action == "pause":
+        job["status"] = "paused"
+        save_broadcast_job(job)
+        await update.message.reply_text(f"⏸ #{job_id} duraklatıldı.")
+        return
+
+    if action == "cancel":
+        job["status"] = "cancelled"
+        save_broadcast_job(job)
+        if job_id not in _broadcast_tasks:
+            _job_targets_path(job_id).unlink(missing_ok=True)
+        await update.message.reply_text(f"🛑 #{job_id} iptal edildi.")
+        return
+
+    if job_id in _broadcast_tasks:
+        await update.message.reply_text("Görev hâlâ duruyor, birkaç saniye sonra tekrar dene.")
+        return
+    if not claim_broadcast_job(job_id):
+        await update.message.reply_text("Görev başka bir bot sürecinde çalışıyor, birkaç saniye sonra tekrar dene.")
+        return
+
+    if job.get("pending"):
+        job["status"] = "scheduled"
+        save_broadcast_job(job)
+        schedule_broadcast_job(context.application, job)
+        if job["start_at"] > time.time():
+            at = datetime.fromtimestamp(job["start_at"], TZ).strftime("%Y-%m-%d %H:%M")
+            await update.message.reply_text(f"🗓 #{job_id} yeniden planlandı: {at}.")
+        else:
+            await update.message.reply_text(f"▶️ #{job_id} güncel kullanıcı listesiyle başlıyor.")
+        return
+
+    job["status"] = "running"
+    save_broadcast_job(job)
+    start_broadcast_job(bulk_bot(context.application), job)
+    await update.message.reply_text(f"▶️ #{job_id} devam ediyor.")
+
+
 def build_2col_rows(items):
     rows = []
     row = []
@@ -185,27 +2394,61 @@ def build_2col_rows(items):
     return rows
 
 
+def _cached_markup(key: str, build) -> InlineKeyboardMarkup:
+    cached = _menu_cache.get(key)
+    if cached and cached[0] == _menu_version:
+        return cached[1]
+
+    markup = build()
+    _menu_cache[key] = (_menu_version, markup)
+    return markup
+
+
 def main_menu() -> InlineKeyboardMarkup:
-    data = load_data()
-    quick = data.get("quick", [])
+    def build() -> InlineKeyboardMarkup:
+        quick = menu_data().get("quick", [])
 
-    keyboard = [
-        [InlineKeyboardButton("🚀 HIZLI REZERVASYON", url=FAST_RESERVATION_URL)]
-    ]
+        keyboard = [
+            [InlineKeyboardButton("🚀 HIZLI REZERVASYON", url=FAST_RESERVATION_URL)]
+        ]
 
-    keyboard += build_2col_rows(quick)
-    keyboard.append([InlineKeyboardButton("📣 Telegram Kanalları", callback_data="menu_channels")])
-    keyboard.append([InlineKeyboardButton("🌐 İnternet Siteleri", callback_data="menu_sites")])
+        keyboard += build_2col_rows(quick)
+        keyboard.append([InlineKeyboardButton("📣 Telegram Kanalları", callback_data="menu_channels")])
+        keyboard.append([InlineKeyboardButton("🌐 İnternet Siteleri", callback_data="menu_sites")])
 
-    return InlineKeyboardMarkup(keyboard)
+        return InlineKeyboardMarkup(keyboard)
 
+    return _cached_markup("home", build)
+
+
+def page_count(items) -> int:
+    return max(1, math.ceil(len(items) / LIST_PAGE_SIZE))
+
+
+def list_to_keyboard(items, key: str, page: int) -> InlineKeyboardMarkup:
+    pages = page_count(items)
+    start = (page - 1) * LIST_PAGE_SIZE
+    keyboard = build_2col_rows(items[start:start + LIST_PAGE_SIZE])
+
+    if pages > 1:
+        nav = []
+        if page > 1:
+            nav.append(InlineKeyboardButton("◀️", callback_data=f"{key}:p{page - 1}"))
+        nav.append(InlineKeyboardButton(f"{page}/{pages}", callback_data="noop"))
+        if page < pages:
+            nav.append(InlineKeyboardButton("▶️", callback_data=f"{key}:p{page + 1}"))
+        keyboard.append(nav)
 
-def list_to_keyboard(items) -> InlineKeyboardMarkup:
-    keyboard = build_2col_rows(items)
     keyboard.append([InlineKeyboardButton("⬅️ Geri", callback_data="back_home")])
     return InlineKeyboardMarkup(keyboard)
 
 
+def list_menu(cat: str, key: str, page: int = 1) -> InlineKeyboardMarkup:
+    items = menu_data().get(cat, [])
+    page = max(1, min(page, page_count(items)))
+    return _cached_markup(f"{cat}:{page}", lambda: list_to_keyboard(items, key, page))
+
+
 def admin_panel_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📋 Listeyi Göster", callback_data="admin_list")],
@@ -218,20 +2461,48 @@ def panel_back_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Panele Dön", callback_data="back_panel")]])
 
 
+def remember_render(message, text_html: str, reply_markup=None) -> None:
+    if message is None:
+        return
+
+    key = (message.chat.id, message.message_id)
+    _rendered[key] = hash((text_html, reply_markup))
+    _rendered.move_to_end(key)
+    if len(_rendered) > RENDER_CACHE_SIZE:
+        _rendered.popitem(last=False)
+
+
 async def smart_edit(query, text_html: str, reply_markup=None):
-    if query.message and query.message.photo:
-        await query.edit_message_caption(
-            caption=text_html,
-            reply_markup=reply_markup,
-            parse_mode="HTML",
-        )
-    else:
-        await query.edit_message_text(
-            text=text_html,
-            reply_markup=reply_markup,
-            parse_mode="HTML",
-            disable_web_page_preview=True,
-        )
+    message = query.message
+    if message is not None:
+        key = (message.chat.id, message.message_id)
+        if _rendered.get(key) == hash((text_html, reply_markup)):
+            return
+        remember_render(message, text_html, reply_markup)
+
+    try:
+        if message and getattr(message, "photo", None):
+            await query.edit_message_caption(
+                caption=text_html,
+                reply_markup=reply_markup,
+                parse_mode="HTML",
+            )
+        else:
+            await query.edit_message_text(
+                text=text_html,
+                reply_markup=reply_markup,
+                parse_mode="HTML",
+                disable_web_page_preview=True,
+            )
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            if message is not None:
+                _rendered.pop((message.chat.id, message.message_id), None)
+            raise
+    except Exception:
+        if message is not None:
+            _rendered.pop((message.chat.id, message.message_id), None)
+        raise
 
 
 def parse_add_args(text: str) -> Tuple[Optional[str], Optional[str]]:
@@ -259,24 +2530,98 @@ def url_ok(url: str) -> bool:
     )
 
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    register_started_user(update.effective_user.id)
+_banner_stamp: Optional[Tuple[int, int]] = None
+_banner_hash: Optional[str] = None
+
+
+def banner_hash() -> Optional[str]:
+    global _banner_stamp, _banner_hash
+
+    try:
+        st = os.stat(BANNER_FILE)
+    except FileNotFoundError:
+        return None
+
+    stamp = (st.st_mtime_ns, st.st_size)
+    if stamp != _banner_stamp:
+        with open(BANNER_FILE, "rb") as f:
+            _banner_hash = hashlib.sha256(f.read()).hexdigest()
+        _banner_stamp = stamp
+    return _banner_hash
+
+
+_banner_lock: Optional[asyncio.Lock] = None
+
+
+def banner_lock() -> asyncio.Lock:
+    global _banner_lock
+    if _banner_lock is None:
+        _banner_lock = asyncio.Lock()
+    return _banner_lock
+
+
+def cached_banner_id(digest: Optional[str]) -> Optional[str]:
+    cached = menu_data().get("banner") or {}
+    return cached.get("file_id") if cached.get("sha256") == digest else None
+
+
+async def send_banner(message, caption: str, reply_markup):
+    digest = banner_hash()
+    failed = None
+
+    file_id = cached_banner_id(digest)
+    if file_id:
+        try:
+            return await message.reply_photo(
+                photo=file_id,
+                caption=caption,
+                reply_markup=reply_markup,
+                parse_mode="HTML",
+            )
+        except BadRequest:
+            failed = file_id
+
+    async with banner_lock():
+        file_id = cached_banner_id(digest)
+        if file_id and file_id != failed:
+            try:
+                return await message.reply_photo(
+                    photo=file_id,
+                    caption=caption,
+                    reply_markup=reply_markup,
+                    parse_mode="HTML",
+                )
+            except BadRequest:
+                pass
 
-    if Path(BANNER_FILE).exists():
         with open(BANNER_FILE, "rb") as photo:
-            await update.message.reply_photo(
+            sent = await message.reply_photo(
                 photo=photo,
-                caption=HOME_TEXT_HTML,
-                reply_markup=main_menu(),
+                caption=caption,
+                reply_markup=reply_markup,
                 parse_mode="HTML",
             )
+
+        banner = {"sha256": digest, "file_id": sent.photo[-1].file_id}
+        await asyncio.to_thread(update_data, lambda data: data.__setitem__("banner", banner))
+        return sent
+
+
+@throttled
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    register_started_user(update.effective_user.id)
+
+    menu = main_menu()
+    if banner_hash():
+        sent = await send_banner(update.message, HOME_TEXT_HTML, menu)
     else:
-        await update.message.reply_text(
+        sent = await update.message.reply_text(
             HOME_TEXT_HTML,
-            reply_markup=main_menu(),
+            reply_markup=menu,
             parse_mode="HTML",
             disable_web_page_preview=True,
         )
+    remember_render(sent, HOME_TEXT_HTML, menu)
 
 
 async def cmd_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -295,58 +2640,279 @@ async def cmd_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
 
 
-async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not is_admin(update.effective_user.id):
-        return
+LINK_CATEGORIES = (
+    ("quick", "⚡️ <b>Ana Menü:</b>"),
+    ("channels", "📣 <b>Kanallar:</b>"),
+    ("sites", "🌐 <b>Siteler:</b>"),
+)
 
-    data = load_data()
-    quick = data.get("quick", [])
-    channels = data.get("channels", [])
-    sites = data.get("sites", [])
-    started_count = len(data.get("started_users", []))
+CATEGORY_ALIASES = {
+    "quick": "quick",
+    "channel": "channels",
+    "channels": "channels",
+    "kanal": "channels",
+    "site": "sites",
+    "sites": "sites",
+}
 
-    def fmt(items):
+
+def _clip(text: str, limit: int = 200) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def list_lines(data: dict):
+    users = data["started_users"]
+    yield "📌 <b>Kayıtlı Linkler</b>"
+    yield ""
+    yield f"👥 <b>/start yapan kişi:</b> {len(users)} (ulaşılabilir: {users.active_count()})"
+    yield ""
+
+    for cat, title in LINK_CATEGORIES:
+        items = data.get(cat, [])
+        yield title
         if not items:
-            return "<i>Boş</i>\n"
-        out = ""
+            yield "<i>Boş</i>"
         for i, (t, u) in enumerate(items, start=1):
-            out += f"{i}) {html.escape(t)} — {html.escape(u)}\n"
-        return out
+            yield f"{i}) {html.escape(_clip(t))} — {html.escape(_clip(u))}"
+        yield ""
+
+    yield "Silmek için:"
+    yield "<code>/delquick 1</code>  <code>/delchannel 1</code>  <code>/delsite 1</code>"
+
+
+def chunk_lines(lines, limit: int = LIST_CHUNK_CHARS) -> list[str]:
+    chunks = []
+    buf = []
+    size = 0
+    for line in lines:
+        if buf and size + len(line) + 1 > limit:
+            chunks.append("\n".join(buf))
+            buf = []
+            size = 0
+        buf.append(line)
+        size += len(line) + 1
+    if buf:
+        chunks.append("\n".join(buf))
+    return chunks
+
+
+def export_links(data: dict) -> bytes:
+    doc = {cat: data.get(cat, []) for cat, _ in LINK_CATEGORIES}
+    return json.dumps(doc, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+def parse_import(raw: str) -> Tuple[dict, list[str]]:
+    rows = []
+    raw = raw.strip()
+    if raw.startswith("{"):
+        try:
+            doc = json.loads(raw)
+        except ValueError as e:
+            return {}, [f"JSON okunamadı: {e}"]
+        for cat, items in doc.items():
+            for i, item in enumerate(items if isinstance(items, list) else [None], start=1):
+                if isinstance(item, list) and len(item) == 2:
+                    rows.append((f"{cat}[{i}]", cat, str(item[0]), str(item[1])))
+                else:
+                    rows.append((f"{cat}[{i}]", cat, "", ""))
+    else:
+        for n, line in enumerate(raw.splitlines(), start=1):
+            if not line.strip():
+                continue
+            parts = [x.strip() for x in line.split("|", 2)]
+            if len(parts) != 3:
+                rows.append((f"satır {n}", "", "", ""))
+                continue
+            rows.append((f"satır {n}", parts[0].lower(), parts[1], parts[2]))
+
+    batch: dict[str, list] = {}
+    errors = []
+    for where, cat, title, url in rows:
+        cat = CATEGORY_ALIASES.get(cat)
+        if cat is None:
+            errors.append(f"{where}: kategori quick / channels / sites olmalı")
+        elif not title or not url_ok(url):
+            errors.append(f"{where}: isim boş ya da link geçersiz")
+        else:
+            batch.setdefault(cat, []).append([title, url])
+    return batch, errors
+
+
+async def apply_import(update: Update, raw: str, replace: bool) -> None:
+    batch, errors = parse_import(raw)
+    if errors:
+        text = "❌ <b>İçe aktarma yapılmadı.</b>\n\n" + "\n".join(html.escape(e) for e in errors[:15])
+        if len(errors) > 15:
+            text += f"\n… ve {len(errors) - 15} hata daha"
+        await update.message.reply_text(text, parse_mode="HTML")
+        return
+    if not batch:
+        await update.message.reply_text("⚠️ İçe aktarılacak link bulunamadı.")
+        return
+
+    def mutate(data: dict) -> None:
+        for cat, items in batch.items():
+            if replace:
+                data[cat] = items
+            else:
+                data.setdefault(cat, []).extend(items)
+
+    update_data(mutate)
+    bump_menu_version()
+    summary = ", ".join(f"{cat}: {len(items)}" for cat, items in batch.items())
+    verb = "değiştirildi" if replace else "eklendi"
+    await update.message.reply_text(f"✅ {sum(len(x) for x in batch.values())} link {verb} ({summary}).")
+
+
+async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update.effective_user.id):
+        return
 
-    text = "📌 <b>Kayıtlı Linkler</b>\n\n"
-    text += f"👥 <b>/start yapan kişi:</b> {started_count}\n\n"
-    text += "⚡️ <b>Ana Menü:</b>\n" + fmt(quick) + "\n"
-    text += "📣 <b>Kanallar:</b>\n" + fmt(channels) + "\n"
-    text += "🌐 <b>Siteler:</b>\n" + fmt(sites) + "\n"
-    text += "Silmek için:\n<code>/delquick 1</code>  <code>/delchannel 1</code>  <code>/delsite 1</code>"
+    data = load_data()
+    total = sum(len(data.get(cat, [])) for cat, _ in LINK_CATEGORIES)
+
+    if total > LIST_DOCUMENT_LINKS:
+        users = data["started_users"]
+        await update.message.reply_document(
+            document=export_links(data),
+            filename=f"links-{datetime.now(TZ).strftime('%Y%m%d')}.json",
+            caption=(
+                f"📌 <b>Kayıtlı Linkler</b> — {total} link\n"
+                f"👥 <b>/start yapan kişi:</b> {len(users)} (ulaşılabilir: {users.active_count()})"
+            ),
+            parse_mode="HTML",
+        )
+        return
 
-    await update.message.reply_text(text, parse_mode="HTML", disable_web_page_preview=True)
+    for chunk in chunk_lines(list_lines(data)):
+        await update.message.reply_text(chunk, parse_mode="HTML", disable_web_page_preview=True)
 
 
 async def cmd_analiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update.effective_user.id):
         return
 
+    parts = (update.message.text or "").strip().split()
+    span = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 7
+    span = max(1, min(span, ANALYTICS_DAILY_DAYS))
+
+    flush_clicks()
+    with _storage_lock:
+        text = analiz_text(span)
+    for chunk in chunk_lines(text.strip().split("\n")):
+        await update.message.reply_text(chunk, parse_mode="HTML")
+
+
+def analiz_text(span: int) -> str:
     data = load_data()
-    started_count = len(data.get("started_users", []))
-    hourly = data.get("analytics", {}).get("hourly", {})
+    started_count = len(data["started_users"])
+    active_count = data["started_users"].active_count()
+    analytics = data["analytics"]
+    hourly = analytics.get("hourly", {})
 
-    today = datetime.now(TZ).strftime("%Y-%m-%d")
+    now = datetime.now(TZ)
+    today = now.strftime("%Y-%m-%d")
     today_hours = hourly.get(today, {})
+    days = [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(span)]
 
     text = "📊 <b>ANALİZ</b>\n\n"
-    text += f"👥 <b>Toplam /start yapan kişi:</b> {started_count}\n\n"
+    text += f"👥 <b>Toplam /start yapan kişi:</b> {started_count}\n"
+    text += f"📬 <b>Ulaşılabilir:</b> {active_count}  🚫 <b>Engelleyen / kapalı:</b> {started_count - active_count}\n\n"
     text += f"🕒 <b>Bugünkü saatlik tıklama dağılımı</b>\n"
     text += f"<i>{today} / Türkiye saati</i>\n\n"
 
+    hour_sketches = analytics["uniques"]["hour"].get(today, {})
     for h in range(24):
         key = f"{h:02d}"
         count = int(today_hours.get(key, 0))
-        text += f"{key}:00 - {key}:59 → <b>{count}</b>\n"
+        people = hour_sketches[key].count() if key in hour_sketches else 0
+        text += f"{key}:00 - {key}:59 → <b>{count}</b> ({people} kişi)\n"
+
+    week_days = days[:7] if span >= 7 else [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    text += "\n👤 <b>Tekil tıklayan (yaklaşık)</b>\n"
+    text += f"Bugün: <b>{unique_count(analytics, [today])}</b>\n"
+    text += f"Son 7 gün: <b>{unique_count(analytics, week_days)}</b>\n"
+    text += f"Son {span} gün: <b>{unique_count(analytics, days)}</b>\n"
+
+    dropped = analytics["throttled"].get(today, {})
+    if dropped:
+        text += (
+            f"\n🛡 <b>Flood ile düşen istek (bugün):</b> {sum(dropped.values())} "
+            f"(hız: {dropped.get('rate', 0)}, tekrar: {dropped.get('dup', 0)})\n"
+        )
+
+    text += "\n🏆 <b>Bugün en çok tıklananlar</b>\n"
+    for button, n in top_buttons([today]) or [("—", 0)]:
+        people = unique_count(analytics, [today], button)
+        text += f"{html.escape(button)} → <b>{n}</b> ({people} kişi)\n"
 
+    text += f"\n📅 <b>Son {span} gün</b>\n"
+    for day in days:
+        text += f"{day} → <b>{int(analytics['daily'].get(day, 0))}</b> ({unique_count(analytics, [day])} kişi)\n"
+
+    text += f"\n🏆 <b>Son {span} günde en çok tıklananlar</b>\n"
+    for button, n in top_buttons(days) or [("—", 0)]:
+        people = unique_count(analytics, days, button)
+        text += f"{html.escape(button)} → <b>{n}</b> ({people} kişi)\n"
+    return text
+
+
+async def cmd_metrics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update.effective_user.id):
+        return
+
+    await update.message.reply_text(metrics_summary(), parse_mode="HTML")
+
+
+async def cmd_profil(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    global _last_snapshot
+
+    if not is_admin(update.effective_user.id):
+        return
+
+    parts = (update.message.text or "").strip().split()
+    action = parts[1].lower() if len(parts) > 1 else ""
+    stamp = datetime.now(TZ).strftime("%Y%m%d-%H%M%S")
+
+    if action == "cpu":
+        seconds = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 5
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        await update.message.reply_text(f"⏱ {seconds} sn CPU örnekleniyor...")
+        report = await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds)
+        await update.message.reply_document(
+            document=report.encode("utf-8"),
+            filename=f"profil-cpu-{stamp}.txt",
+            caption=f"CPU profili ({seconds} sn)",
+        )
+        return
+
+    if action == "mem":
+        if len(parts) > 2 and parts[2].lower() == "stop":
+            tracemalloc.stop()
+            _last_snapshot = None
+            await update.message.reply_text("tracemalloc kapatıldı.")
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            await update.message.reply_text(
+                "tracemalloc açıldı. Bir süre sonra tekrar /profil mem yaz; "
+                "her snapshot bir öncekiyle karşılaştırılır."
+            )
+            return
+        report = await asyncio.to_thread(memory_report)
+        await update.message.reply_document(
+            document=report.encode("utf-8"),
+            filename=f"profil-mem-{stamp}.txt",
+            caption="Bellek profili",
+        )
+        return
+
+    with _storage_lock:
+        text = profile_summary(context.application)
     await update.message.reply_text(text, parse_mode="HTML")
 
 
+@serialized_per_user
 async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     cancelled = False
 
@@ -358,6 +2924,10 @@ async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         context.user_data.pop("broadcast_flow", None)
         cancelled = True
 
+    if context.user_data.get("import_flow"):
+        context.user_data.pop("import_flow", None)
+        cancelled = True
+
     await update.message.reply_text("❌ İptal edildi." if cancelled else "İptal edilecek bir işlem yok.")
 
 
@@ -372,6 +2942,7 @@ async def start_add_flow(update: Update, context: ContextTypes.DEFAULT_TYPE, cat
     )
 
 
+@serialized_per_user
 async def handle_text_flows(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = (update.message.text or "").strip()
     if not text:
@@ -391,16 +2962,27 @@ async def handle_text_flows(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("⚠️ Henüz hedef kitle yok.")
             return
 
-        ok, fail = 0, 0
-        for uid in user_ids:
-            try:
-                await context.bot.send_photo(chat_id=uid, photo=file_id, caption=text)
-                ok += 1
-            except Exception:
-                fail += 1
-
         context.user_data.pop("broadcast_flow", None)
-        await update.message.reply_text(f"✅ Broadcast bitti.\nGönderildi: {ok}\nHata: {fail}")
+        start_at = bflow.get("start_at")
+        window = int(bflow.get("window") or 0)
+        if bflow.get("auto"):
+            with _storage_lock:
+                start_at = int(quiet_start(load_data()["analytics"], window).timestamp())
+
+        job = create_broadcast_job(update.effective_chat.id, file_id, text, user_ids, start_at, window)
+        if job["status"] == "scheduled":
+            schedule_broadcast_job(context.application, job)
+            at = datetime.fromtimestamp(job["start_at"], TZ).strftime("%Y-%m-%d %H:%M")
+            spread = f", {window // 60} dakikaya yayılarak" if window else ""
+            await update.message.reply_text(
+                f"🗓 <b>Broadcast planlandı</b> <code>#{job['id']}</code>\n"
+                f"Başlangıç: {at} (Türkiye saati){spread}.\n"
+                f"İptal: <code>/jobs cancel {job['id']}</code>",
+                parse_mode="HTML",
+            )
+            return
+
+        start_broadcast_job(bulk_bot(context.application), job)
         return
 
     flow = context.user_data.get("add_flow")
@@ -423,56 +3005,117 @@ async def handle_text_flows(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("❌ Link formatı yanlış.")
             return
 
-        data = load_data()
         cat = flow.get("cat")
         name = flow.get("name")
-        data.setdefault(cat, []).append([name, url])
-        save_data(data)
+        update_data(lambda data: data.setdefault(cat, []).append([name, url]))
+        bump_menu_version()
         context.user_data.pop("add_flow", None)
 
         await update.message.reply_text("✅ Eklendi. /start ile kontrol edebilirsin.")
         return
 
 
+@serialized_per_user
 async def cmd_addquick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update.effective_user.id):
         return
     name, url = parse_add_args(update.message.text)
     if name and url and url_ok(url):
-        data = load_data()
-        data.setdefault("quick", []).append([name, url])
-        save_data(data)
+        update_data(lambda data: data.setdefault("quick", []).append([name, url]))
+        bump_menu_version()
         await update.message.reply_text("✅ Ana menüye eklendi.")
         return
     await start_add_flow(update, context, "quick")
 
 
+@serialized_per_user
 async def cmd_addsite(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update.effective_user.id):
         return
     name, url = parse_add_args(update.message.text)
     if name and url and url_ok(url):
-        data = load_data()
-        data.setdefault("sites", []).append([name, url])
-        save_data(data)
+        update_data(lambda data: data.setdefault("sites", []).append([name, url]))
+        bump_menu_version()
         await update.message.reply_text("✅ Site eklendi.")
         return
     await start_add_flow(update, context, "sites")
 
 
+@serialized_per_user
 async def cmd_addchannel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update.effective_user.id):
         return
     name, url = parse_add_args(update.message.text)
     if name and url and url_ok(url):
-        data = load_data()
-        data.setdefault("channels", []).append([name, url])
-        save_data(data)
+        update_data(lambda data: data.setdefault("channels", []).append([name, url]))
+        bump_menu_version()
         await update.message.reply_text("✅ Kanal eklendi.")
         return
     await start_add_flow(update, context, "channels")
 
 
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update.effective_user.id):
+        return
+
+    await update.message.reply_document(
+        document=export_links(load_data()),
+        filename=f"links-{datetime.now(TZ).strftime('%Y%m%d')}.json",
+        caption="📦 Linkler. Geri yüklemek için: /import replace",
+    )
+
+
+@serialized_per_user
+async def cmd_import(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update.effective_user.id):
+        return
+
+    head, _, body = (update.message.text or "").partition("\n")
+    replace = "replace" in head.split()[1:]
+    if body.strip():
+        await apply_import(update, body, replace)
+        return
+
+    context.user_data["import_flow"] = {"replace": replace}
+    await update.message.reply_text(
+        "📥 <b>İçe aktarma</b>\n\n"
+        "/export ile aldığın JSON dosyasını ya da her satırı\n"
+        "<code>kategori | İsim | https://link</code>\n"
+        "olan bir .txt dosyası gönder.\n"
+        "Kategori: quick, channels, sites\n\n"
+        + ("Dosyadaki kategoriler <b>tamamen değiştirilecek</b>.\n" if replace else "Linkler listelerin sonuna eklenecek.\n")
+        + "İptal: /cancel",
+        parse_mode="HTML",
+    )
+
+
+@serialized_per_user
+async def handle_import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    flow = context.user_data.get("import_flow")
+    if not flow:
+        return
+
+    if not is_admin(update.effective_user.id):
+        context.user_data.pop("import_flow", None)
+        return
+
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text("❌ Dosya çok büyük.")
+        return
+
+    file = await document.get_file()
+    raw = bytes(await file.download_as_bytearray())
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await update.message.reply_text("❌ Dosya UTF-8 metin olmalı.")
+        return
+
+    context.user_data.pop("import_flow", None)
+    await apply_import(update, text, bool(flow.get("replace")))
+
+
 async def del_generic(update: Update, cat: str, usage: str) -> None:
     if not is_admin(update.effective_user.id):
         return
@@ -483,16 +3126,22 @@ async def del_generic(update: Update, cat: str, usage: str) -> None:
         return
 
     idx = int(parts[1]) - 1
-    data = load_data()
-    items = data.get(cat, [])
 
-    if idx < 0 or idx >= len(items):
+    def remove(data: dict) -> Optional[list]:
+        items = data.setdefault(cat, [])
+        if idx < 0 or idx >= len(items):
+            return None
+        return items.pop(idx)
+
+    if not 0 <= idx < len(load_data().get(cat, [])):
         await update.message.reply_text("❌ Geçersiz sıra numarası.")
         return
 
-    removed = items.pop(idx)
-    data[cat] = items
-    save_data(data)
+    removed = update_data(remove)
+    if removed is None:
+        await update.message.reply_text("❌ Geçersiz sıra numarası.")
+        return
+    bump_menu_version()
 
     await update.message.reply_text(f"🗑️ Silindi: {removed[0]}")
 
@@ -509,84 +3158,212 @@ async def cmd_delchannel(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await del_generic(update, "channels", "/delchannel 1")
 
 
+def parse_page(arg: str) -> int:
+    if arg[:1] == "p" and arg[1:].isdigit():
+        return int(arg[1:])
+    return 1
+
+
+async def cb_menu_channels(query, arg: str) -> None:
+    await smart_edit(
+        query,
+        "📣 <b>Telegram Kanallarımız</b>\nAşağıdan kanala tıkla 👇",
+        reply_markup=list_menu("channels", "menu_channels", parse_page(arg)),
+    )
+
+
+async def cb_menu_sites(query, arg: str) -> None:
+    await smart_edit(
+        query,
+        "🌐 <b>İnternet Sitelerimiz</b>\nAşağıdan siteye tıkla 👇",
+        reply_markup=list_menu("sites", "menu_sites", parse_page(arg)),
+    )
+
+
+async def cb_back_home(query, arg: str) -> None:
+    await smart_edit(query, HOME_TEXT_HTML, reply_markup=main_menu())
+
+
+async def cb_back_panel(query, arg: str) -> None:
+    await smart_edit(query, "🛠 <b>Admin Panel</b>\nAşağıdan seç 👇", reply_markup=admin_panel_menu())
+
+
+async def cb_admin_list(query, arg: str) -> None:
+    await smart_edit(query, "Liste için /list yaz.", reply_markup=panel_back_menu())
+
+
+async def cb_admin_add_help(query, arg: str) -> None:
+    text = (
+        "➕ <b>Ekleme</b>\n\n"
+        "<code>/addquick</code>\n"
+        "<code>/addsite</code>\n"
+        "<code>/addchannel</code>\n\n"
+        "Tek satır örnek:\n"
+        "<code>/addquick İsim | https://link</code>\n\n"
+        "Toplu ekleme: <code>/import</code>\n"
+        "Yedek: <code>/export</code>"
+    )
+    await smart_edit(query, text, reply_markup=panel_back_menu())
+
+
+async def cb_admin_del_help(query, arg: str) -> None:
+    text = (
+        "➖ <b>Silme</b>\n\n"
+        "<code>/delquick 1</code>\n"
+        "<code>/delsite 1</code>\n"
+        "<code>/delchannel 1</code>"
+    )
+    await smart_edit(query, text, reply_markup=panel_back_menu())
+
+
+async def cb_noop(query, arg: str) -> None:
+    pass
+
+
+CALLBACK_ROUTES = {
+    "menu_channels": (cb_menu_channels, False),
+    "menu_sites": (cb_menu_sites, False),
+    "back_home": (cb_back_home, False),
+    "back_panel": (cb_back_panel, True),
+    "admin_list": (cb_admin_list, True),
+    "admin_add_help": (cb_admin_add_help, True),
+    "admin_del_help": (cb_admin_del_help, True),
+    "noop": (cb_noop, False),
+}
+
+
+@throttled
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    await query.answer()
+    key, _, arg = (query.data or "").partition(":")
+    route = CALLBACK_ROUTES.get(key)
+    if route is None:
+        await query.answer()
+        return
 
-    if query.data:
-        track_click(query.from_user.id, query.data)
+    answer = asyncio.ensure_future(query.answer())
+    flush = None
+    if key != "noop" and track_click(query.from_user.id, key):
+        flush = asyncio.ensure_future(asyncio.to_thread(flush_clicks))
 
-    data = load_data()
-    channels = data.get("channels", [])
-    sites = data.get("sites", [])
-
-    if query.data == "menu_channels":
-        await smart_edit(
-            query,
-            "📣 <b>Telegram Kanallarımız</b>\nAşağıdan kanala tıkla 👇",
-            reply_markup=list_to_keyboard(channels),
-        )
-        return
+    try:
+        handler, admin_only = route
+        if not admin_only or is_admin(query.from_user.id):
+            await handler(query, arg)
+    finally:
+        await asyncio.gather(*(x for x in (answer, flush) if x))
 
-    if query.data == "menu_sites":
-        await smart_edit(
-            query,
-            "🌐 <b>İnternet Sitelerimiz</b>\nAşağıdan siteye tıkla 👇",
-            reply_markup=list_to_keyboard(sites),
-        )
-        return
 
-    if query.data == "back_home":
-        await smart_edit(query, HOME_TEXT_HTML, reply_markup=main_menu())
-        return
+async def compact_storage_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await asyncio.to_thread(compact_storage)
 
-    if query.data == "back_panel":
-        if not is_admin(query.from_user.id):
-            return
-        await smart_edit(query, "🛠 <b>Admin Panel</b>\nAşağıdan seç 👇", reply_markup=admin_panel_menu())
-        return
 
-    if query.data == "admin_list":
-        if not is_admin(query.from_user.id):
-            return
-        await smart_edit(query, "Liste için /list yaz.", reply_markup=panel_back_menu())
-        return
+async def flush_clicks_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await asyncio.to_thread(flush_clicks)
 
-    if query.data == "admin_add_help":
-        if not is_admin(query.from_user.id):
-            return
-        text = (
-            "➕ <b>Ekleme</b>\n\n"
-            "<code>/addquick</code>\n"
-            "<code>/addsite</code>\n"
-            "<code>/addchannel</code>\n\n"
-            "Tek satır örnek:\n"
-            "<code>/addquick İsim | https://link</code>"
-        )
-        await smart_edit(query, text, reply_markup=panel_back_menu())
-        return
 
-    if query.data == "admin_del_help":
-        if not is_admin(query.from_user.id):
-            return
-        text = (
-            "➖ <b>Silme</b>\n\n"
-            "<code>/delquick 1</code>\n"
-            "<code>/delsite 1</code>\n"
-            "<code>/delchannel 1</code>"
-        )
-        await smart_edit(query, text, reply_markup=panel_back_menu())
-        return
+async def persist_flows_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await context.application.persistence.flush()
 
 
-def main():
-    token = os.getenv("BOT_TOKEN")
-    if not token:
-        raise RuntimeError("BOT_TOKEN bulunamadı. Render ENV'e BOT_TOKEN girmelisin.")
+def bulk_bot(app: Application):
+    return app.bot_data.get("bulk_bot", app.bot)
+
+
+def prewarm() -> None:
+    try:
+        load_data()
+        banner_hash()
+        main_menu()
+        list_menu("channels", "menu_channels")
+        list_menu("sites", "menu_sites")
+    except Exception as e:
+        print(f"Ön ısıtma başarısız: {e!r}")
+
+
+async def deferred_startup_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    app = context.application
+    await bulk_bot(app).initialize()
+    await resume_broadcast_jobs(app)
 
-    ensure_data_file()
 
-    app = Application.builder().token(token).build()
+async def drop_stale_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    global _stale_dropped
+
+    message = update.message
+    if message and message.date and time.time() - message.date.timestamp() > PENDING_MAX_AGE:
+        _stale_dropped += 1
+        raise ApplicationHandlerStop
+
+
+async def on_startup(app: Application) -> None:
+    global _banner_lock, _broadcast_bucket
+
+    mark_boot("initialize")
+    _banner_lock = asyncio.Lock()
+    _broadcast_bucket = TokenBucket(BROADCAST_RATE)
+    app.bot_data["prewarm"] = asyncio.create_task(asyncio.to_thread(prewarm))
+    app.bot_data["loop_monitor"] = asyncio.create_task(monitor_loop_lag())
+    await start_metrics_server(app)
+    app.job_queue.run_once(deferred_startup_job, BOOT_DEFER_SECONDS)
+    mark_boot("ready")
+    print(boot_report())
+
+
+async def on_shutdown(app: Application) -> None:
+    server = app.bot_data.get("metrics_server")
+    if server:
+        server.close()
+    monitor = app.bot_data.get("loop_monitor")
+    if monitor:
+        monitor.cancel()
+    await bulk_bot(app).shutdown()
+    compact_storage()
+
+
+def interactive_request() -> TimedRequest:
+    return TimedRequest(
+        connection_pool_size=HTTP_POOL_SIZE,
+        pool_timeout=HTTP_POOL_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        http_version=http_version(),
+    )
+
+
+def bulk_request() -> TimedRequest:
+    return TimedRequest(
+        pool="bulk",
+        connection_pool_size=BULK_POOL_SIZE,
+        pool_timeout=BULK_POOL_TIMEOUT,
+        read_timeout=BULK_READ_TIMEOUT,
+        http_version=http_version(),
+    )
+
+
+def build_application(
+    token: str,
+    request=None,
+    get_updates_request=None,
+    persistence=None,
+    bulk=None,
+) -> Application:
+    builder = (
+        Application.builder()
+        .token(token)
+        .persistence(persistence if persistence is not None else FlowPersistence(FLOWS_FILE))
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(on_startup)
+        .post_stop(stop_broadcast_jobs)
+        .post_shutdown(on_shutdown)
+    )
+    builder = builder.request(request if request is not None else interactive_request())
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    app = builder.build()
+    app.bot_data["bulk_bot"] = ExtBot(token, request=bulk if bulk is not None else bulk_request())
+    app.job_queue.run_repeating(compact_storage_job, interval=JOURNAL_COMPACT_SECONDS, first=JOURNAL_COMPACT_SECONDS)
+    app.job_queue.run_repeating(flush_clicks_job, interval=CLICK_FLUSH_SECONDS, first=CLICK_FLUSH_SECONDS)
+    app.job_queue.run_repeating(persist_flows_job, interval=FLOW_PERSIST_SECONDS, first=FLOW_PERSIST_SECONDS)
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CallbackQueryHandler(on_callback))
@@ -596,6 +3373,8 @@ def main():
     app.add_handler(CommandHandler("panel", cmd_panel))
     app.add_handler(CommandHandler("list", cmd_list))
     app.add_handler(CommandHandler("analiz", cmd_analiz))
+    app.add_handler(CommandHandler("metrics", cmd_metrics))
+    app.add_handler(CommandHandler("profil", cmd_profil))
 
     app.add_handler(CommandHandler("addquick", cmd_addquick))
     app.add_handler(CommandHandler("addsite", cmd_addsite))
@@ -605,12 +3384,57 @@ def main():
     app.add_handler(CommandHandler("delsite", cmd_delsite))
     app.add_handler(CommandHandler("delchannel", cmd_delchannel))
 
+    app.add_handler(CommandHandler("export", cmd_export))
+    app.add_handler(CommandHandler("import", cmd_import))
+
     app.add_handler(CommandHandler("broadcast", cmd_broadcast))
+    app.add_handler(CommandHandler("jobs", cmd_jobs))
     app.add_handler(MessageHandler(filters.PHOTO, handle_broadcast_photo))
+    app.add_handler(MessageHandler(filters.Document.ALL, handle_import_document))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_flows))
 
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler)
+
+    if PENDING_UPDATES == "stale":
+        app.add_handler(TypeHandler(Update, drop_stale_update), group=-1)
+
+    return app
+
+
+def main():
+    if sys.argv[1:2] == ["migrate"]:
+        if SQLITE_FILE.exists():
+            print(f"{SQLITE_FILE} zaten var, taşıma yapılmadı.")
+            return
+        if migrate_json_to_sqlite(DATA_FILE, EVENTS_FILE, SqliteStorage(SQLITE_FILE)):
+            print(f"{DATA_FILE} → {SQLITE_FILE} taşındı.")
+        else:
+            print(f"{DATA_FILE} bulunamadı.")
+        return
+
+    mark_boot("module")
+    token = os.getenv("BOT_TOKEN")
+    if not token:
+        raise RuntimeError("BOT_TOKEN bulunamadı. Render ENV'e BOT_TOKEN girmelisin.")
+
+    app = build_application(token)
+    mark_boot("build")
+
     print("Bot çalışıyor... Telegram’da /start deneyebilirsin.")
-    app.run_polling()
+    drop_pending = PENDING_UPDATES == "drop"
+    if WEBHOOK_URL:
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            drop_pending_updates=drop_pending,
+        )
+    else:
+        app.run_polling(drop_pending_updates=drop_pending)
 
 
 if __name__ == "__main__":
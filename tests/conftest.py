@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# main.py opens its storage in the working directory at import time.
+os.chdir(tempfile.mkdtemp(prefix="bot-tests-"))
+os.environ.setdefault("STORAGE_BACKEND", "json")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
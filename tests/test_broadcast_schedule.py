@@ -0,0 +1,81 @@
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+import pytest
+from telegram import Update
+
+import bench
+import main
+
+NOW = datetime(2026, 10, 17, 22, 10, tzinfo=main.TZ)
+
+
+def at(*args):
+    return int(datetime(*args, tzinfo=main.TZ).timestamp())
+
+
+@pytest.mark.parametrize("args, expected", [
+    ([], (None, 0, False)),
+    (["23:00"], (at(2026, 10, 17, 23, 0), 0, False)),
+    (["21:30"], (at(2026, 10, 18, 21, 30), 0, False)),
+    (["23:00", "90m"], (at(2026, 10, 17, 23, 0), 5400, False)),
+    (["2030-01-01", "10:00"], (at(2030, 1, 1, 10, 0), 0, False)),
+    (["10:00", "2030-01-01"], (at(2030, 1, 1, 10, 0), 0, False)),
+    (["2h", "2030-01-01", "10:00"], (at(2030, 1, 1, 10, 0), 7200, False)),
+    (["auto"], (None, main.BROADCAST_AUTO_WINDOW, True)),
+    (["auto", "30dk"], (None, 1800, True)),
+])
+def test_parse_broadcast_schedule(args, expected):
+    assert main.parse_broadcast_schedule(args, NOW) == expected
+
+
+@pytest.mark.parametrize("args", [
+    ["2020-01-01", "10:00"],
+    ["2026-10-17", "21:00"],
+    ["2030-01-01"],
+    ["2030-02-30", "10:00"],
+    ["25:00"],
+    ["auto", "21:00"],
+    ["yarın"],
+])
+def test_parse_broadcast_schedule_rejects(args):
+    assert main.parse_broadcast_schedule(args, NOW) is None
+
+
+def test_shaped_rate_never_exceeds_global_rate():
+    assert main.shaped_rate(10, 0) == main.BROADCAST_RATE
+    assert main.shaped_rate(100_000, 60) == main.BROADCAST_RATE
+    assert main.shaped_rate(3600, 3600) == 1.0
+
+
+def test_resume_paused_scheduled_job_requeues(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "BROADCAST_DIR", tmp_path)
+    monkeypatch.setattr(main, "THROTTLE_RATE", 0)
+    monkeypatch.setenv("ADMIN_IDS", "1")
+    api = bench.FakeBotApi(0)
+
+    async def run():
+        transport = httpx.MockTransport(api.handle)
+        app = main.build_application(
+            bench.BOT_TOKEN,
+            request=main.TimedRequest(httpx_kwargs={"transport": transport}),
+            get_updates_request=main.TimedRequest(httpx_kwargs={"transport": transport}),
+            bulk=main.TimedRequest(pool="bulk", httpx_kwargs={"transport": transport}),
+        )
+        await app.initialize()
+        job = main.create_broadcast_job(1, "f", "c", [10, 11], int(time.time()) + 3600)
+        main.schedule_broadcast_job(app, job)
+        for n, text in enumerate((f"/jobs pause {job['id']}", f"/jobs resume {job['id']}"), 1):
+            await app.process_update(Update.de_json(bench.message_update(n, 1, text, int(time.time())), app.bot))
+        queued = len(app.job_queue.get_jobs_by_name(f"broadcast-{job['id']}"))
+        await app.shutdown()
+        main._broadcast_jobs.pop(job["id"])
+        main.release_broadcast_job(job["id"])
+        return job, queued
+
+    job, queued = asyncio.run(run())
+    assert job["status"] == "scheduled"
+    assert queued == 1
+    assert api.calls.get("sendPhoto", 0) == 0
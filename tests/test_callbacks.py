@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import httpx
+from telegram import Update
+
+import bench
+import main
+
+
+def callback_update(bot, update_id, data, markup):
+    message = {
+        "message_id": 77,
+        "date": int(time.time()),
+        "chat": {"id": 5, "type": "private"},
+        "photo": [{"file_id": "x", "file_unique_id": "x", "width": 1, "height": 1}],
+        "caption": "c",
+        "reply_markup": markup.to_dict(),
+    }
+    return Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": 5, "is_bot": False, "first_name": "u"},
+            "chat_instance": "x",
+            "data": data,
+            "message": message,
+        },
+    }, bot)
+
+
+def test_double_back_home_edits_once(monkeypatch):
+    monkeypatch.setattr(main, "THROTTLE_RATE", 0)
+    main._rendered.clear()
+    api = bench.FakeBotApi(0)
+
+    async def run():
+        transport = httpx.MockTransport(api.handle)
+        app = main.build_application(
+            bench.BOT_TOKEN,
+            request=main.TimedRequest(httpx_kwargs={"transport": transport}),
+            get_updates_request=main.TimedRequest(httpx_kwargs={"transport": transport}),
+            bulk=main.TimedRequest(pool="bulk", httpx_kwargs={"transport": transport}),
+        )
+        await app.initialize()
+        tapped_on = main.list_menu("sites", "menu_sites")
+        await app.process_update(callback_update(app.bot, 1, "back_home", tapped_on))
+        await app.process_update(callback_update(app.bot, 2, "back_home", tapped_on))
+        await app.process_update(callback_update(app.bot, 3, "menu_sites", tapped_on))
+        await app.shutdown()
+
+    asyncio.run(run())
+    assert api.calls["answerCallbackQuery"] == 3
+    assert api.calls["editMessageCaption"] == 2
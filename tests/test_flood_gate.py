@@ -0,0 +1,27 @@
+import main
+
+
+def test_duplicate_within_window():
+    gate = main.FloodGate(rate=10, burst=10, window=2, capacity=100)
+    assert gate.check(1, "menu_sites", now=0.0) is None
+    assert gate.check(1, "menu_sites", now=1.0) == "dup"
+    assert gate.check(1, "menu_sites", now=2.5) is None
+    assert gate.check(1, "back_home", now=2.6) is None
+
+
+def test_rate_limit_refills():
+    gate = main.FloodGate(rate=1, burst=2, window=0, capacity=100)
+    assert gate.check(1, "a", now=0.0) is None
+    assert gate.check(1, "b", now=0.0) is None
+    assert gate.check(1, "c", now=0.0) == "rate"
+    assert gate.check(1, "d", now=1.0) is None
+    assert gate.check(2, "a", now=1.0) is None
+
+
+def test_capacity_evicts_least_recent_user():
+    gate = main.FloodGate(rate=1, burst=1, window=0, capacity=2)
+    gate.check(1, "a", now=0.0)
+    gate.check(2, "a", now=0.0)
+    gate.check(1, "b", now=0.0)
+    gate.check(3, "a", now=0.0)
+    assert list(gate.users) == [1, 3]
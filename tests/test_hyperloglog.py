@@ -0,0 +1,36 @@
+import main
+
+
+def test_count_is_close_to_cardinality():
+    sketch = main.HyperLogLog()
+    for uid in range(10_000):
+        sketch.add(uid)
+        sketch.add(uid)
+    assert abs(sketch.count() - 10_000) < 10_000 * 0.05
+
+
+def test_small_counts_are_exact_enough():
+    sketch = main.HyperLogLog()
+    for uid in (5, 6, 7):
+        sketch.add(uid)
+    assert sketch.count() == 3
+    assert main.HyperLogLog().count() == 0
+
+
+def test_merge_counts_union():
+    a = main.HyperLogLog()
+    b = main.HyperLogLog()
+    for uid in range(0, 6000):
+        a.add(uid)
+    for uid in range(4000, 10_000):
+        b.add(uid)
+    merged = main.HyperLogLog().merge(a).merge(b)
+    assert abs(merged.count() - 10_000) < 10_000 * 0.05
+
+
+def test_serialisation_round_trip():
+    sketch = main.HyperLogLog()
+    for uid in range(500):
+        sketch.add(uid)
+    assert main.HyperLogLog.from_json(sketch.to_json()).count() == sketch.count()
+    assert main.HyperLogLog.from_bytes(sketch.to_bytes()).count() == sketch.count()
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import main
+
+TODAY = datetime.now(main.TZ).strftime("%Y-%m-%d")
+
+
+def make_storage(tmp_path):
+    return main.JsonStorage(tmp_path / "links.json", tmp_path / "events.jsonl")
+
+
+def append(storage, event):
+    storage.append(event)
+    main._apply_event(storage.load(), event)
+
+
+def start_event(uid, ts=1_700_000_000):
+    return {"t": "start", "u": uid, "ts": ts}
+
+
+def test_save_rejects_stale_version(tmp_path):
+    a = make_storage(tmp_path)
+    b = make_storage(tmp_path)
+    data_a = a.load()
+    data_b = b.load()
+
+    data_a["sites"].append(["A", "https://a"])
+    assert a.save(data_a, data_a["version"])
+
+    data_b["sites"].append(["B", "https://b"])
+    assert not b.save(data_b, data_b["version"])
+
+    b.invalidate()
+    data_b = b.load()
+    data_b["sites"].append(["B", "https://b"])
+    assert b.save(data_b, data_b["version"])
+
+    names = [name for name, _ in make_storage(tmp_path).load()["sites"]]
+    assert names[-2:] == ["A", "B"]
+
+
+def test_save_keeps_events_appended_by_other_instance(tmp_path):
+    a = make_storage(tmp_path)
+    b = make_storage(tmp_path)
+    data = a.load()
+    version = data["version"]
+
+    b.append(start_event(1))
+    assert a.save(data, version)
+    assert list(make_storage(tmp_path).load()["started_users"].ids) == [1]
+
+
+def test_tail_journal_waits_for_complete_line(tmp_path):
+    writer = make_storage(tmp_path)
+    writer.append(start_event(1))
+    journal = writer._journal_path()
+
+    line = json.dumps(start_event(2)) + "\n"
+    with journal.open("a", encoding="utf-8") as f:
+        f.write(line[:10])
+
+    reader = make_storage(tmp_path)
+    assert list(reader.load()["started_users"].ids) == [1]
+
+    with journal.open("a", encoding="utf-8") as f:
+        f.write(line[10:])
+    assert list(reader.load()["started_users"].ids) == [1, 2]
+
+
+def test_compaction_does_not_replay_events(tmp_path):
+    a = make_storage(tmp_path)
+    b = make_storage(tmp_path)
+    event = {"t": "clicks", "c": [[TODAY, "10", "menu_sites", 3]], "s": [], "ts": 0}
+    append(a, event)
+    assert b.load()["analytics"]["daily"] == {TODAY: 3}
+
+    a.compact()
+    assert b.load()["analytics"]["daily"] == {TODAY: 3}
+    assert a.load()["analytics"]["daily"] == {TODAY: 3}
+
+
+def test_migrate_json_to_sqlite_round_trip(tmp_path):
+    source = make_storage(tmp_path)
+    data = source.load()
+    data["channels"] = [["Kanal", "https://t.me/kanal"]]
+    assert source.save(data, data["version"])
+
+    source.append(start_event(10))
+    source.append(start_event(11))
+    source.append({"t": "inactive", "u": [11], "ts": 1_700_000_100})
+    source.append({
+        "t": "clicks",
+        "c": [[TODAY, "10", "menu_sites", 3], [TODAY, "11", "back_home", 2]],
+        "s": [[TODAY, "10", "menu_sites", 10]],
+        "d": [[TODAY, "dup", 4]],
+        "ts": 0,
+    })
+
+    target = main.SqliteStorage(tmp_path / "bot.db")
+    assert main.migrate_json_to_sqlite(tmp_path / "links.json", tmp_path / "events.jsonl", target)
+
+    migrated = main.SqliteStorage(tmp_path / "bot.db").load()
+    assert migrated["channels"] == [["Kanal", "https://t.me/kanal"]]
+    assert list(migrated["started_users"].ids) == [10, 11]
+    assert migrated["started_users"].active_ids() == [10]
+
+    analytics = migrated["analytics"]
+    assert analytics["daily"] == {TODAY: 5}
+    assert analytics["hourly"] == {TODAY: {"10": 3, "11": 2}}
+    assert analytics["throttled"] == {TODAY: {"dup": 4}}
+    assert main.unique_count(analytics, [TODAY]) == 1
+    assert dict(target.top_buttons([TODAY])) == {"menu_sites": 3, "back_home": 2}
+
+
+def test_migrate_missing_json(tmp_path):
+    target = main.SqliteStorage(tmp_path / "bot.db")
+    assert not main.migrate_json_to_sqlite(tmp_path / "links.json", tmp_path / "events.jsonl", target)
+
+
+def test_sqlite_instances_follow_each_other_by_events(tmp_path):
+    a = main.SqliteStorage(tmp_path / "bot.db")
+    b = main.SqliteStorage(tmp_path / "bot.db")
+    a.load()
+    cached = b.load()
+
+    append(a, start_event(1))
+    append(b, start_event(2))
+    append(a, {"t": "clicks", "c": [[TODAY, "10", "menu_sites", 3]], "s": [[TODAY, "10", "menu_sites", 1]], "ts": 0})
+
+    assert b.load() is cached
+    for storage in (a, b):
+        data = storage.load()
+        assert list(data["started_users"].ids) == [1, 2]
+        assert data["analytics"]["daily"] == {TODAY: 3}
+        assert main.unique_count(data["analytics"], [TODAY]) == 1
+
+    data = a.load()
+    data["sites"].append(["Yeni", "https://yeni"])
+    assert a.save(data, data["version"])
+    assert b.load() is not cached
+    assert b.load()["sites"][-1] == ["Yeni", "https://yeni"]
+
+
+def test_sqlite_reloads_when_events_were_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SQLITE_EVENTS_KEEP", 1)
+    a = main.SqliteStorage(tmp_path / "bot.db")
+    b = main.SqliteStorage(tmp_path / "bot.db")
+    b.load()
+
+    for uid in (1, 2, 3):
+        append(a, start_event(uid))
+    a.compact()
+
+    assert list(b.load()["started_users"].ids) == [1, 2, 3]
+
+
+def test_menu_does_not_wait_for_storage_lock():
+    main.load_data()
+    held, release = threading.Event(), threading.Event()
+
+    def compaction():
+        with main._storage_lock:
+            held.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=compaction)
+    worker.start()
+    held.wait(5)
+    try:
+        t0 = time.perf_counter()
+        main.list_menu("channels", "menu_channels")
+        assert time.perf_counter() - t0 < 1
+    finally:
+        release.set()
+        worker.join()
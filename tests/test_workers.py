@@ -0,0 +1,45 @@
+import asyncio
+import fcntl
+import json
+
+import main
+
+
+def test_broadcast_job_claimed_by_one_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "BROADCAST_DIR", tmp_path)
+
+    other = (tmp_path / "1.lock").open("a")
+    fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    assert not main.claim_broadcast_job("1")
+
+    other.close()
+    assert main.claim_broadcast_job("1")
+    assert main.claim_broadcast_job("1")
+    main.release_broadcast_job("1")
+    assert "1" not in main._job_locks
+
+
+def test_stop_requested_reads_other_worker_status(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "BROADCAST_DIR", tmp_path)
+    job = {"id": "2", "status": "running"}
+    main.save_broadcast_job(job)
+    assert main.stop_requested(job) is None
+
+    main.save_broadcast_job({**job, "status": "paused"})
+    assert main.stop_requested(job) == "paused"
+
+
+def test_flows_merge_across_workers(tmp_path):
+    path = tmp_path / "flows.json"
+    first, second = main.FlowPersistence(path), main.FlowPersistence(path)
+
+    async def run():
+        await first.update_user_data(1, {"add_flow": {"step": "name"}})
+        await second.update_user_data(2, {"broadcast_flow": {"step": "text"}})
+        await first.flush()
+        await second.flush()
+        await first.update_user_data(1, {})
+        await first.flush()
+
+    asyncio.run(run())
+    assert json.loads(path.read_text()) == {"2": {"broadcast_flow": {"step": "text"}}}